@@ -1,20 +1,105 @@
+import logging
 import os
-import spacy
-from flask import Flask, render_template, request, jsonify, g, url_for
-from picto_translator.translator import Text2PictoTranslator
-from picto_translator.picto_db import PictoDB
-from picto_translator.germanet import GermaNet
-from picto_translator.linguistic_analyser import LinguisticAnalyser
-from sqlite3 import connect
-from PIL import Image
-
-germanet = GermaNet()
-LinguisticAnalyser = LinguisticAnalyser()
-
+import sqlite3
+import time
+from flask import Flask, Response, abort, g, render_template, request, jsonify, url_for
+from picto_translator import metrics
+from picto_translator.translator import DATA_FILES, Text2PictoTranslator
+from picto_translator.picto_db import PICTO_DB_FILE
+from picto_translator.picto_tables import PictoTables
+from picto_translator.containers import TokenRecord
+from picto_translator.resources import get_germanet, get_negated_pictos, registry
+from picto_translator.translation_cache import CachedTranslator, SQLiteTranslationStore, make_key_prefix
+
+logging.basicConfig(level=os.environ.get('PICTO_LOG_LEVEL', 'INFO').upper())
+
+# spaCy components that are loaded, cf. picto_translator.linguistic_analyser.ANALYSER_PROFILES
+ANALYSER_PROFILE = os.environ.get('PICTO_ANALYSER_PROFILE', 'lean')
 
 app = Flask(__name__,static_folder='static')
-translator = Text2PictoTranslator() # GermaNet and MetaComToGermaNet are loaded here
-DATABASE = '/static/data/metacom_to_germanet.db'
+translator = Text2PictoTranslator(analyser_profile=ANALYSER_PROFILE) # GermaNet and MetaComToGermaNet are loaded here
+# the translator's resources are shared, i.e. not loaded a second time here
+germanet = get_germanet()
+negated_pictos = get_negated_pictos()
+app.logger.info('Resources loaded: %s', registry.format_load_report())
+
+
+def warm_up():
+    """
+    Translates a sentence once, so that all lazily initialised parts of the resources are created when the app is
+    loaded. In preload mode (cf. gunicorn.conf.py), this happens in the master process before the workers are forked.
+    """
+    translator.translate('Der Hund spielt im Garten.')
+
+
+warm_up()
+DATABASE = PICTO_DB_FILE
+# batch size and number of processes of spaCy's nlp.pipe when translating the lines of a text
+BATCH_SIZE = int(os.environ.get('PICTO_BATCH_SIZE', 64))
+N_PROCESS = int(os.environ.get('PICTO_N_PROCESS', 1))
+# maximum number of whole-sentence translations that can be requested with k_best in /translate
+MAX_K_BEST = int(os.environ.get('PICTO_MAX_K_BEST', 10))
+# translations are cached per line in each worker; with PICTO_TRANSLATION_CACHE_DB, also in a SQLite file shared by all
+# workers. The keys contain a fingerprint of the version of the cached translations (TRANSLATION_FORMAT_VERSION), the
+# settings of the translator and its data files, so that translations made by another version of the code, with other
+# settings or with other data are not returned.
+TRANSLATION_CACHE_DB = os.environ.get('PICTO_TRANSLATION_CACHE_DB')
+TRANSLATION_CACHE_TTL = float(os.environ.get('PICTO_TRANSLATION_CACHE_TTL', 3600))
+cached_translator = CachedTranslator(
+    translator, maxsize=int(os.environ.get('PICTO_TRANSLATION_CACHE_SIZE', 2048)), ttl=TRANSLATION_CACHE_TTL,
+    shared_store=SQLiteTranslationStore(
+        TRANSLATION_CACHE_DB, maxsize=int(os.environ.get('PICTO_TRANSLATION_CACHE_DB_SIZE', 100000)),
+        ttl=TRANSLATION_CACHE_TTL) if TRANSLATION_CACHE_DB else None,
+    key_prefix=make_key_prefix(translator.settings(), DATA_FILES))
+# JSON exports of the database tables served by /get_pictos, encoded once per worker
+picto_tables = PictoTables(DATABASE)
+# seconds browsers and proxies may reuse a table export before revalidating it with its ETag
+TABLES_MAX_AGE = int(os.environ.get('PICTO_TABLES_MAX_AGE', 3600))
+try:
+    picto_tables.prebuild()
+except (OSError, sqlite3.Error) as e:
+    app.logger.warning('Pictogram tables not exported at start-up: %s', e)
+# with PICTO_SERVER_TIMING=1, the time of each stage of the translation is returned in the Server-Timing header
+SERVER_TIMING = os.environ.get('PICTO_SERVER_TIMING', '0') == '1'
+
+# the counters of the caches and of the translator are read when /metrics is requested
+CACHES = {'translations': cached_translator.cache, 'germanet': germanet.cache, 'negated_pictos': negated_pictos.cache,
+          'picto_tables': picto_tables.cache}
+metrics.registry.callback_counter('picto_cache_hits_total', 'Cache hits',
+                                  lambda: {name: cache.hits for name, cache in CACHES.items()}, 'cache')
+metrics.registry.callback_counter('picto_cache_misses_total', 'Cache misses',
+                                  lambda: {name: cache.misses for name, cache in CACHES.items()}, 'cache')
+metrics.registry.callback_counter('picto_germanet_lookups_total', 'Synset searches in GermaNet (cached or not)',
+                                  lambda: germanet.cache.hits + germanet.cache.misses)
+REQUEST_SECONDS = metrics.registry.histogram('picto_request_seconds', 'Time of the requests in seconds', 'endpoint')
+REQUEST_PRUNED_SYNSETS = metrics.registry.histogram(
+    'picto_request_pruned_synsets', 'Synsets pruned for the lines of a /translate request (also for cached lines)',
+    buckets=metrics.COUNT_BUCKETS)
+
+
+@app.before_request
+def start_timing():
+    g.start_time = time.perf_counter()
+    if SERVER_TIMING:
+        metrics.start_request_timings()
+
+
+@app.after_request
+def stop_timing(response):
+    """
+    Observes the time of the request and, with PICTO_SERVER_TIMING=1, adds the times of the translation stages and of
+    the whole request to the Server-Timing header (and, for /translate, the numbers of synsets found and pruned).
+    """
+    duration = time.perf_counter() - g.start_time
+    REQUEST_SECONDS.observe(duration, request.endpoint or 'unknown')
+    if SERVER_TIMING:
+        timings = metrics.stop_request_timings() or dict()
+        timings['total'] = duration
+        entries = ['%s;dur=%.2f' % (stage, seconds * 1000) for stage, seconds in timings.items()]
+        if 'synset_counts' in g:
+            entries.append('synsets;desc="%d found, %d pruned"' % g.synset_counts)
+        response.headers['Server-Timing'] = ', '.join(entries)
+    return response
 
 
 @app.route('/version')
@@ -22,17 +107,6 @@ def version():
     return "Version 1.0.1, deployed on 2024-03-05"
 
 
-def get_db():
-    if 'db' not in g:
-        g.db = connect(DATABASE,check_same_thread=False)
-    return g.db
-
-@app.teardown_request
-def teardown_db(exception=None):
-    picto_db = PictoDB(DATABASE)
-    picto_db.close_conn()
-
-
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -40,32 +114,73 @@ def index():
 
 @app.route('/get_pictos')
 def get_pictos():
+    """
+    Returns the rows of a table of the pictogram-synset database as JSON list. Optional parameters: columns (comma-
+    separated column names), offset and limit; the number of rows of the whole table is returned in X-Total-Count.
+    """
     table = request.args.get('table', 'simple_pictos')
-    valid_tables = ['simple_pictos', 'complex_pictos', 'gendered_pictos', 'bw_colour_pictos', 'pictos', 'numbered_pictos']
-
-    if table not in valid_tables:
-        return jsonify({'error': 'Invalid table name'}), 400
-
-    picto_db = PictoDB(DATABASE)
-    conn = picto_db.get_conn()
-    cur = conn.cursor()
-    cur.execute(f"SELECT * FROM {table}")
-    rows = cur.fetchall()
-    return jsonify(rows)
-
-def add_nichtkein(image_path):
-    # Get the absolute path to the 'static' directory
-    static_path = os.path.join(app.root_path, 'static')
-    # add the redcross on top of the image
-    image = Image.open(os.path.join(static_path, 'data', image_path))
-    redcross = os.path.join(static_path, 'data', 'METACOM_Symbole/Symbole_PNG/PNG_ohne_Rahmen/Kleine_Worte/nichtkein.png')
-    redcross = Image.open(redcross)
-    image.paste(redcross, (0, 0), redcross)
-    # Save the new image
-    neg_path = image_path.replace('.png', '_negated.png')
-    image.save(os.path.join(static_path, 'data', neg_path))
-    
-    return neg_path
+    columns = request.args.get('columns')
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args['limit']) if 'limit' in request.args else None
+    except ValueError:
+        return jsonify({'error': 'Invalid offset or limit'}), 400
+    if offset < 0 or (limit is not None and limit < 0):
+        return jsonify({'error': 'Invalid offset or limit'}), 400
+
+    try:
+        export = picto_tables.get(table, columns.split(',') if columns else None, offset, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # the gzip-compressed export is a different representation, so it has its own (strong) ETag
+    if request.accept_encodings['gzip']:
+        response = Response(export.gzip_data, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(export.etag + '-gzip')
+    else:
+        response = Response(export.data, mimetype='application/json')
+        response.set_etag(export.etag)
+    response.vary.add('Accept-Encoding')
+    response.headers['X-Total-Count'] = str(export.total)
+    response.cache_control.public = True
+    response.cache_control.max_age = TABLES_MAX_AGE
+    return response.make_conditional(request)
+
+
+@app.route('/cache_stats')
+def cache_stats():
+    """
+    Returns the counters of the caches of the worker process handling the request, and the numbers of synsets found and
+    pruned (i.e. without pictograms, not searched on the semantic route) for the translated lines.
+    """
+    return jsonify({'translations': cached_translator.stats(), 'germanet': germanet.cache.stats(),
+                    'negated_pictos': negated_pictos.cache.stats(),
+                    'synsets': {'found': metrics.SYNSETS.get(), 'pruned': metrics.PRUNED_SYNSETS.get()}})
+
+
+@app.route('/metrics')
+def metrics_text():
+    """
+    Returns the metrics (stage and request times, counters) of the worker process handling the request in the Prometheus
+    text format.
+    """
+    return Response(metrics.registry.to_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/negated/<path:picto_path>')
+def negated_picto(picto_path):
+    """
+    Serves the negated variant of a pictogram (with the red cross on top) from the in-memory cache.
+    """
+    data, etag = negated_pictos.get(picto_path)
+    if data is None:
+        abort(404)
+    response = Response(data, mimetype='image/png')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = 86400
+    return response.make_conditional(request)
 
 
 @app.route('/translate', methods=['POST'])
@@ -78,12 +193,45 @@ def translate_text():
     no_art = data.get('no_art', False)
     no_prep = data.get('no_prep', False)
     no_punct = data.get('no_punct', False)
+    # number of whole-sentence translations with the lowest costs; the best one is the translation itself, the others
+    # are returned as sentence_alternatives
+    try:
+        k_best = min(max(int(data.get('k_best', 1)), 1), MAX_K_BEST)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid k_best'}), 400
 
     response_data = []
-
-    for line in text.split('\n'):
-        # Process each line
-        translation, bw_translation, translated_words, further_translations = translator.translate(line)
+    sentence_alternatives = []
+
+    # Process all lines at once
+    synset_counts = []
+    lines = cached_translator.translate_batch(text.split('\n'), batch_size=BATCH_SIZE, n_process=N_PROCESS,
+                                              k_best=k_best, synset_counts=synset_counts)
+    g.synset_counts = (sum(found for found, _ in synset_counts), sum(pruned for _, pruned in synset_counts))
+    REQUEST_PRUNED_SYNSETS.observe(g.synset_counts[1])
+
+    # with "payload": "tokens", the translation is returned independent of the display options, which are then applied
+    # by the client (cf. static/text2picto.js)
+    if data.get('payload') == 'tokens':
+        for line in lines:
+            response_data.extend(payload_items(*line[:4]))
+            response_data.append({'line_break': True})
+            if k_best > 1:
+                sentence_alternatives.append([[{'cost': cost, 'translation': payload_items(
+                    [alternative], [bw_alternative], [alternative_words])}
+                    for alternative, bw_alternative, alternative_words, cost in sentence_k_best[1:]]
+                    for sentence_k_best in line[4]])
+        if k_best > 1:
+            return jsonify({'translations': response_data, 'sentence_alternatives': sentence_alternatives})
+        return jsonify({'translations': response_data})
+
+    for line in lines:
+        translation, bw_translation, translated_words, further_translations = line[:4]
+        if k_best > 1:
+            sentence_alternatives.append([[{'cost': cost, 'translation': alternative_items(
+                alternative, bw_alternative, alternative_words, use_bw, no_art, no_prep, no_punct)}
+                for alternative, bw_alternative, alternative_words, cost in sentence_k_best[1:]]
+                for sentence_k_best in line[4]])
 
         new_translated_words = []
         new_translations = []
@@ -122,48 +270,28 @@ def translate_text():
             for i, (translation, other_translations, word) in enumerate(zip(sentence_translation, further_translations_list, translated_sentence)):
                 
                 image_path = translation.replace("\\", "/")if translation else None
-                print (image_path)
-                if tuple([str(w) for w in word]) == tuple(['#NEG#']) and 'nichtkein' in image_path:
+                app.logger.debug('Pictogram %s', image_path)
+                # the negation pictogram is drawn onto the following pictogram (also without a black-and-white variant)
+                if tuple([str(w) for w in word]) == tuple(['#NEG#']) and (image_path is None
+                                                                       or 'nichtkein' in image_path):
                     negate_next_pictogram = True
                     neg_path = image_path
                     continue
                 if negate_next_pictogram:
-                    if translation:
-                        neg_path = add_nichtkein(image_path)
-                        # picto_url = url_for('static', filename=os.path.join('data', neg_path.replace("\\", "/")))
-                        picto_url = 'static/data/' + neg_path.replace("\\", "/")
-                        negate_next_pictogram = False
-
-                    if isinstance(word, tuple):
-                        word_text = [token.text for token in word if isinstance(token, spacy.tokens.token.Token)] 
-                        word_text = ' '.join(word_text)
-                    else:
-                        word_text = word.text
-
-                    doc = LinguisticAnalyser.analyse(word_text)[0]
-                    token = next(iter(doc), None)
-
-                    if token is not None:
-                        synsets, penalties, is_antonym = germanet.get_synsets_and_penalties(token)
-                        antonym_text = None
-                        if any(is_antonym):
-                            antonym_index = is_antonym.index(True)
-                            antonym_synset = synsets[antonym_index]
-                            antonym_lexunit = antonym_synset.lexunits[0]
-                            antonym_text = antonym_lexunit.orthform
-                            word_text = 'nicht ' + antonym_text
+                    negate_next_pictogram = False
+                    # without a pictogram (e.g. without black-and-white variant), the word is shown as any word
+                    # without pictogram
+                    if image_path:
+                        picto_url = 'negated/' + image_path
                         response_item = {
-                            'text': word_text,
+                            'text': negated_word_text(word),
                             'src': picto_url,
-                            
                         }
-                        print (picto_url)
-                        print (response_item)
+                        app.logger.debug('Negated pictogram %s: %s', picto_url, response_item)
                         response_data.append(response_item)
                         continue
 
-
-                elif image_path:
+                if image_path:
                     # picto_url = url_for('static', filename=os.path.join('data', image_path.replace("\\", "/"))) 
                     picto_url = 'static/data/' + image_path.replace("\\", "/")
 
@@ -191,12 +319,97 @@ def translate_text():
         # Append a special marker for a line break                
         response_data.append({'line_break': True})
 
+    if k_best > 1:
+        return jsonify({'translations': response_data, 'sentence_alternatives': sentence_alternatives})
     return jsonify({'translations': response_data})
 
 
+def negated_word_text(word):
+    """
+    Returns the text shown for words (a TranslatedSpan) translated with the negated pictogram of an antonym, i.e.
+    'nicht <antonym>' with the surface form of the antonym found on the semantic route.
+    """
+    if word.antonym is None:
+        return ' '.join(w.text for w in word)
+    return 'nicht ' + word.antonym
+
+
+def token_item(word):
+    """
+    Returns the attributes of a translated token that the client needs to apply the display options.
+    """
+    if isinstance(word, str):
+        return {'text': word, 'lemma': word, 'upper': word.upper(), 'tag': '', 'is_punct': False}
+    return {'text': word.text, 'lemma': word.lemma_, 'upper': word.text.upper(), 'tag': word.tag_,
+            'is_punct': word.is_punct}
+
+
+def payload_items(translation, bw_translation, translated_words, further_translations=None):
+    """
+    Returns the response items of the sentences of a translation independent of the display options: the tokens of each pictogram
+    (text, lemma, upper case, STTS tag, punctuation flag), the colour and the black-and-white pictogram and the
+    alternative pictograms. A pictogram preceded by the negation pictogram is returned as negated variant, with the
+    text 'nicht <antonym>'.
+    """
+    items = []
+    negated = False
+    if further_translations is None:
+        further_translations = [[[]] * len(sentence_words) for sentence_words in translated_words]
+    for sentence in zip(translation, bw_translation, translated_words, further_translations):
+        for picto, bw_picto, word, other_translations in zip(*sentence):
+            if tuple(str(w) for w in word) == ('#NEG#',):
+                negated = True
+                continue
+            response_item = {'tokens': [token_item(w) for w in word]}
+            if isinstance(picto, str):
+                # without a black-and-white variant, the word is shown without pictogram in black-and-white
+                prefix = 'negated/' if negated else 'static/data/'
+                response_item['src'] = prefix + picto.replace("\\", "/")
+                if isinstance(bw_picto, str):
+                    response_item['bw_src'] = prefix + bw_picto.replace("\\", "/")
+                if negated:
+                    response_item['negated'] = True
+                    response_item['text'] = negated_word_text(word)
+                elif other_translations:
+                    response_item['alternatives'] = ['static/data/' + alt_path.replace("\\", "/")
+                                                     for alt_path in other_translations]
+            else:
+                response_item['no_picto'] = True
+            negated = False
+            items.append(response_item)
+    return items
+
+
+def alternative_items(translation, bw_translation, translated_words, use_bw, no_art, no_prep, no_punct):
+    """
+    Returns the response items of an alternative sentence translation. Unlike in the translation itself, the negation
+    pictogram is not drawn onto the following pictogram; the latter is marked as negated instead.
+    """
+    items = []
+    negated = False
+    for picto, bw_picto, word in zip(translation, bw_translation, translated_words):
+        if tuple(str(w) for w in word) == ('#NEG#',):
+            negated = True
+            continue
+        if any(should_filter(w, no_art, no_prep, no_punct) for w in word):
+            negated = False
+            continue
+        picto = bw_picto if use_bw else picto
+        response_item = {'text': ' '.join(w.text for w in word)}
+        if isinstance(picto, str):
+            response_item['src'] = 'static/data/' + picto.replace("\\", "/")
+        else:
+            response_item['no_picto'] = True
+        if negated:
+            response_item['negated'] = True
+            negated = False
+        items.append(response_item)
+    return items
+
+
 def should_filter(word, no_art, no_prep, no_punct):
-    # Check if 'word' is a SpaCy Token and has the necessary properties
-    if isinstance(word, spacy.tokens.Token):
+    # Check if 'word' is a token (TokenRecord) and has the necessary properties
+    if isinstance(word, TokenRecord):
         return ((no_art and word.tag_ == 'ART') or
                 (no_prep and word.tag_ == 'APPR') or
                 (no_punct and word.is_punct))
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compares the spaCy analyser profiles (cf. picto_translator.linguistic_analyser.ANALYSER_PROFILES): load time, resident
+memory and per-request latency on the regression corpus. Also checks that every profile yields exactly the same
+analysis as the 'full' profile for all token attributes the translator uses, i.e. that translations are unchanged.
+Each profile is measured in a fresh process. Run from the main folder of the project:
+
+    python benchmarks/bench_analyser_profiles.py [--profiles full lean] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.linguistic_analyser import ANALYSER_PROFILES, LinguisticAnalyser  # noqa: E402
+from picto_translator.resources import current_rss_mb  # noqa: E402
+
+
+def token_signature(analysed_doc):
+    """
+    Returns all token attributes of a spaCy Doc that are used by the translator.
+    """
+    return [[token.text, token.tag_, token.lemma_, str(token.morph), token.dep_, token.head.i, token.is_sent_start,
+             token.is_punct] for token in analysed_doc]
+
+
+def measure_profile(profile, corpus, repeat):
+    """
+    Loads the analyser with the profile and analyses each line of the corpus repeat times.
+    """
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    analyser = LinguisticAnalyser(profile)
+    load_time = time.perf_counter() - start
+    rss_loaded = current_rss_mb()
+
+    latencies = []
+    signatures = []
+    for i in range(repeat):
+        for line in corpus:
+            start = time.perf_counter()
+            analysed_doc, _ = analyser.analyse(line)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if i == 0:
+                signatures.append(token_signature(analysed_doc))
+
+    latencies.sort()
+    return {'profile': profile, 'load_s': load_time, 'rss_loaded_mb': rss_loaded,
+            'rss_model_mb': rss_loaded - rss_before if rss_loaded is not None else None,
+            'mean_ms': statistics.mean(latencies), 'p50_ms': latencies[len(latencies) // 2],
+            'p95_ms': latencies[int(len(latencies) * 0.95)], 'signatures': signatures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', nargs='+', default=list(ANALYSER_PROFILES))
+    parser.add_argument('--corpus', default=os.path.join(ROOT, 'benchmarks', 'regression_corpus.txt'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding='utf-8') as corpus_file:
+        corpus = [line.strip() for line in corpus_file if line.strip()]
+
+    if args.worker:
+        print(json.dumps(measure_profile(args.worker, corpus, args.repeat)))
+        return 0
+
+    profiles = ['full'] + [p for p in args.profiles if p != 'full']
+    results = dict()
+    exit_code = 0
+    for profile in profiles:
+        process = subprocess.run([sys.executable, __file__, '--worker', profile, '--corpus', args.corpus,
+                                  '--repeat', str(args.repeat)], capture_output=True, text=True)
+        if process.returncode != 0:
+            print('%-16s failed to run: %s' % (profile, process.stderr.strip().splitlines()[-1]))
+            exit_code = 1
+            continue
+        results[profile] = json.loads(process.stdout)
+
+    print('%-16s %8s %12s %12s %9s %9s %9s  %s' % ('profile', 'load s', 'RSS MB', 'model MB', 'mean ms', 'p50 ms',
+                                                 'p95 ms', 'analysis'))
+    for profile, result in results.items():
+        if 'full' not in results:
+            unchanged = 'n/a'
+        elif result['signatures'] == results['full']['signatures']:
+            unchanged = 'unchanged'
+        else:
+            unchanged = 'CHANGED'
+            exit_code = 1
+        print('%-16s %8.2f %12s %12s %9.2f %9.2f %9.2f  %s' % (
+            profile, result['load_s'], '%.0f' % result['rss_loaded_mb'] if result['rss_loaded_mb'] else 'n/a',
+            '%.0f' % result['rss_model_mb'] if result['rss_model_mb'] else 'n/a', result['mean_ms'], result['p50_ms'],
+            result['p95_ms'], unchanged))
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures the GermaNet search cache (cf. GermaNet.get_synsets_and_penalties): translates the regression corpus several
+times with and without the cache, checks that the translations are unchanged and reports the time per pass and the
+cache counters. Can also write a frequency list (lemma, tag, count) of a corpus to prewarm the cache at startup with
+the environment variable PICTO_GERMANET_PREWARM. Run from the main folder of the project:
+
+    python benchmarks/bench_germanet_cache.py [--repeat 5] [--write-frequency-list static/data/frequencies.tsv]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.resources import get_germanet, get_linguistic_analyser  # noqa: E402
+from picto_translator.translator import Text2PictoTranslator  # noqa: E402
+
+
+def translate_corpus(translator, corpus, repeat):
+    """
+    Translates the corpus repeat times and returns the translations of the first pass and the time of each pass.
+    """
+    translations = None
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = [translator.translate(line)[:2] for line in corpus]
+        times.append(time.perf_counter() - start)
+        if translations is None:
+            translations = results
+    return translations, times
+
+
+def write_frequency_list(corpus, file_name):
+    """
+    Writes the lemmas and tags of the corpus, sorted by descending frequency, as a frequency list.
+    """
+    analyser = get_linguistic_analyser()
+    frequencies = Counter((word.lemma_, word.tag_) for analysed_doc, _ in analyser.analyse_batch(corpus)
+                          for word in analysed_doc if not word.is_punct)
+    with open(file_name, 'w', encoding='utf-8') as frequency_list:
+        for (lemma, tag), count in frequencies.most_common():
+            frequency_list.write('%s\t%s\t%d\n' % (lemma, tag, count))
+    print('Wrote %d lemmas to %s' % (len(frequencies), file_name))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join(ROOT, 'benchmarks', 'regression_corpus.txt'))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--write-frequency-list', metavar='FILE')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    with open(args.corpus, encoding='utf-8') as corpus_file:
+        corpus = [line.strip() for line in corpus_file if line.strip()]
+
+    if args.write_frequency_list:
+        write_frequency_list(corpus, args.write_frequency_list)
+        return 0
+
+    translator = Text2PictoTranslator()
+    germanet = get_germanet()
+    maxsize = germanet.cache.maxsize
+
+    germanet.cache.maxsize = 0
+    germanet.cache.clear()
+    uncached, uncached_times = translate_corpus(translator, corpus, args.repeat)
+
+    germanet.cache.maxsize = maxsize
+    cached, cached_times = translate_corpus(translator, corpus, args.repeat)
+
+    print('%-10s %12s %12s' % ('cache', 'first pass s', 'later pass s'))
+    print('%-10s %12.3f %12.3f' % ('off', uncached_times[0], min(uncached_times[1:] or uncached_times)))
+    print('%-10s %12.3f %12.3f' % ('on', cached_times[0], min(cached_times[1:] or cached_times)))
+    print('cache: %s' % ', '.join('%s %s' % (name, '%.2f' % value if isinstance(value, float) else value)
+                                  for name, value in germanet.cache.stats().items()))
+    if cached != uncached:
+        print('Translations CHANGED by the cache.')
+        return 1
+    print('Translations unchanged.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures the hypernym search of GermaNet (cf. GermaNet._search_hypernyms) for several numbers of hypernym levels: by
+walking the direct hypernyms level by level (as before the hypernym closure) and by looking the hypernyms up in the
+precomputed hypernym closure. Checks that the closure finds the same hypernyms as the walk, each once with its lowest
+penalty, in the same order. Searches the synsets of all orthographic forms of GermaNet (or of the first --forms forms).
+Run from the main folder of the project:
+
+    python benchmarks/bench_hypernym_closure.py [--levels 1,3,5,8] [--forms 20000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.germanet_snapshot import (GERMANET_SNAPSHOT_DIR, GERMANET_XML_DIR,  # noqa: E402
+                                                GermaNetSnapshot, HypernymClosure, load_germanet)
+
+
+def walk_hypernyms(synsets, hypernym_levels):
+    """
+    The previous GermaNet._search_hypernyms: walks the direct hypernyms level by level, keeping duplicates.
+    """
+    found_hypernyms = []
+    penalties = []
+    hypernyms = synsets
+    for i in range(hypernym_levels):
+        hypernyms = [hypernym for synset in hypernyms for hypernym in synset.direct_hypernyms]
+        found_hypernyms += hypernyms
+        penalties += [(i + 1) * 8 for _ in hypernyms]
+    return found_hypernyms, penalties
+
+
+def without_duplicates(hypernyms, penalties):
+    """
+    Returns the (hypernym ID, penalty) pairs, keeping the first (i.e. lowest) penalty of each hypernym.
+    """
+    found = dict()
+    for hypernym, penalty in zip(hypernyms, penalties):
+        found.setdefault(hypernym.id, penalty)
+    return list(found.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xml-dir', default=os.path.join(ROOT, GERMANET_XML_DIR))
+    parser.add_argument('--snapshot-dir', default=os.path.join(ROOT, GERMANET_SNAPSHOT_DIR))
+    parser.add_argument('--levels', default='1,3,5,8', help='comma-separated numbers of hypernym levels')
+    parser.add_argument('--forms', type=int, help='number of orthographic forms to search (default: all)')
+    args = parser.parse_args()
+
+    germanet = load_germanet(args.xml_dir, args.snapshot_dir)
+    if isinstance(germanet, GermaNetSnapshot):
+        forms = [germanet.orthforms[i] for i in range(len(germanet.orthforms))]
+    else:
+        forms = list(germanet.orthform2lexid)
+    searches = [germanet.get_synsets_by_orthform(form) for form in forms[:args.forms]]
+
+    print('%-8s %14s %18s %16s %22s' % ('levels', 'walk µs', 'closure µs', 'closure load s', 'hypernyms (walk/set)'))
+    for hypernym_levels in (int(levels) for levels in args.levels.split(',')):
+        start = time.perf_counter()
+        if isinstance(germanet, GermaNetSnapshot):
+            closure = germanet.get_hypernym_closure(hypernym_levels)
+        else:
+            closure = HypernymClosure.from_germanet(germanet, hypernym_levels)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        walked = [walk_hypernyms(synsets, hypernym_levels) for synsets in searches]
+        walk_time = time.perf_counter() - start
+        start = time.perf_counter()
+        found = [closure.get_hypernyms(synsets) for synsets in searches]
+        closure_time = time.perf_counter() - start
+
+        for synsets, (hypernyms, penalties), closure_hypernyms in zip(searches, walked, found):
+            if (without_duplicates(hypernyms, penalties)
+                    != [(hypernym.id, level * 8) for hypernym, level in closure_hypernyms]):
+                raise AssertionError('the closure finds other hypernyms for %s' % synsets)
+        n_walked = sum(len(hypernyms) for hypernyms, _ in walked)
+        n_found = sum(len(hypernyms) for hypernyms in found)
+        print('%-8d %14.1f %18.1f %16.2f %22s' % (hypernym_levels, walk_time * 1e6 / len(searches),
+                                                  closure_time * 1e6 / len(searches), load_time,
+                                                  '%d/%d' % (n_walked, n_found)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures time and memory of the OptimalPathSearcher on long sentences. The translation candidates are generated randomly
+(simple candidates and complex candidates over 2-3 consecutive words, similar to the output of the direct and semantic
+route), so no spaCy model or GermaNet is needed. For each sentence length, reports the time to build the lattice and to
+decode it (the lattice is cached in the SentenceState), the memory held by the lattice and the peak memory allocated
+while decoding (tracemalloc). Also checks that decoding twice gives the same result and leaves the SentenceState
+unchanged. Run from the main folder of the project:
+
+    python benchmarks/bench_path_search.py [--lengths 10 50 100 200 400] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.containers import Document, WordTranslationCandidates  # noqa: E402
+from picto_translator.optimal_path_searcher import OptimalPathSearcher  # noqa: E402
+
+
+class RandomSentenceState:
+    """
+    Stands in for a SentenceState with random translation candidates for n_words words.
+    """
+
+    def __init__(self, n_words, rng):
+        self.candidate_translations = [WordTranslationCandidates('word%d' % i) for i in range(n_words)]
+        self.lattice = None
+        for i in range(0, n_words, 4):
+            if rng.random() < 0.3 and i + 2 <= n_words:
+                picto = 'complex%d.png' % i
+                for word_candidates in self.candidate_translations[i:i + rng.choice([2, 3])]:
+                    word_candidates.add_candidate(picto, rng.choice([-8, 0, 8]), 'complex', False, None)
+        for word_candidates in self.candidate_translations:
+            for _ in range(rng.choice([0, 1, 2, 3, 4])):
+                picto = 'simple%d.png' % rng.randrange(1000)
+                word_candidates.add_candidate(picto, rng.choice([-8, 0, 7, 8, 16, 24]), 'simple', rng.random() < 0.1,
+                                              picto)
+
+    def signature(self):
+        return [(c.picto_paths, c.penalties, c.translation_type, c.antonym) for c in self.candidate_translations]
+
+
+def measure(n_words, repeat, rng):
+    """
+    Decodes repeat random sentences of n_words words and returns the mean times in ms, the mean memory of the lattice
+    and the peak memory of decoding in KB.
+    """
+    searcher = OptimalPathSearcher()
+    build_time = decode_time = lattice_memory = peak = 0
+    for _ in range(repeat):
+        sentence_state = RandomSentenceState(n_words, rng)
+        signature = sentence_state.signature()
+        doc = Document('')
+        doc.sentence_states = [sentence_state]
+
+        start = time.perf_counter()
+        searcher.get_lattice(sentence_state)
+        build_time += time.perf_counter() - start
+        sentence_state.lattice = None
+        tracemalloc.start()
+        searcher.get_lattice(sentence_state)
+        lattice_memory += tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        first = searcher.find_best_path(doc)
+        decode_time += time.perf_counter() - start
+        tracemalloc.start()
+        second = searcher.find_best_path(doc)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        if second != first or sentence_state.signature() != signature:
+            raise AssertionError('decoding changed the SentenceState')
+    return build_time * 1000 / repeat, decode_time * 1000 / repeat, lattice_memory / 1024 / repeat, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[10, 50, 100, 200, 400])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print('%8s %10s %10s %12s %16s' % ('words', 'build ms', 'decode ms', 'lattice KB', 'decode peak KB'))
+    for n_words in args.lengths:
+        print('%8d %10.3f %10.3f %12.1f %16.1f' % ((n_words,) + measure(n_words, args.repeat, rng)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
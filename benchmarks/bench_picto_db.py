@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures the latency of pictogram lookups (simple pictogram with female/plural variants, complex pictograms) in the
+pictogram-synset database: with a new connection per request (as PictoDB did with one connection per Flask request),
+with the pooled per-thread connections of PictoDB and with the in-memory PictoIndex. Reports the best of several runs
+and checks that all give the same results. Run from the main folder of the project:
+
+    python benchmarks/bench_picto_db.py [--requests 1000] [--lookups-per-request 20] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.picto_db import PICTO_DB_FILE, PictoDB, PictoIndex  # noqa: E402
+
+
+class PerRequestPictoDB(PictoDB):
+    """
+    PictoDB with a new connection per request, opened by start_request() and closed by end_request().
+    """
+
+    def __init__(self, db_file):
+        super().__init__(db_file)
+        self._conn = None
+
+    def start_request(self):
+        self._conn = self._create_connection(self.db_file)
+
+    def end_request(self):
+        self._conn.close()
+        self._conn = None
+
+    def get_conn(self):
+        return self._conn
+
+
+def lookup(picto_db, synset_id, is_fem, is_plur):
+    """
+    Runs the lookups of the semantic route for one synset.
+    """
+    simple = picto_db.check_if_simple_picto(synset_id, is_fem, is_plur)
+    complex_pictos = [(c.picto_path, c.bw_picto_path, c.dependent_synsets) for c in picto_db.get_complex_pictos(synset_id)]
+    return simple, complex_pictos
+
+
+def run(picto_db, requests):
+    """
+    Runs all requests and returns the results and the time per lookup in µs.
+    """
+    results = []
+    n_lookups = 0
+    start = time.perf_counter()
+    for request in requests:
+        if isinstance(picto_db, PerRequestPictoDB):
+            picto_db.start_request()
+        for synset_id, is_fem, is_plur in request:
+            results.append(lookup(picto_db, synset_id, is_fem, is_plur))
+        n_lookups += len(request)
+        if isinstance(picto_db, PerRequestPictoDB):
+            picto_db.end_request()
+    return results, (time.perf_counter() - start) * 1e6 / n_lookups
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-file', default=os.path.join(ROOT, PICTO_DB_FILE))
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--lookups-per-request', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    conn = PictoDB._create_connection(args.db_file)
+    synset_ids = [row[0] for row in conn.execute("SELECT synset_id FROM simple_pictos")]
+    synset_ids += [row[0] for row in conn.execute("SELECT DISTINCT head_synset_id FROM complex_pictos")]
+    conn.close()
+    # about half of the synsets of a sentence have no pictogram
+    synset_ids += ['s%d' % i for i in range(len(synset_ids))]
+    requests = [[(rng.choice(synset_ids), rng.random() < 0.3, rng.random() < 0.3)
+                 for _ in range(args.lookups_per_request)] for _ in range(args.requests)]
+
+    start = time.perf_counter()
+    picto_index = PictoIndex(args.db_file)
+    index_load_time = time.perf_counter() - start
+
+    expected = None
+    print('%-28s %14s' % ('', 'µs per lookup'))
+    for name, picto_db in (('connection per request', PerRequestPictoDB(args.db_file)),
+                           ('pooled connection', PictoDB(args.db_file)),
+                           ('in-memory index', picto_index)):
+        runs = [run(picto_db, requests) for _ in range(args.repeat)]
+        results = runs[0][0]
+        latency = min(latency for _, latency in runs)
+        if expected is None:
+            expected = results
+        elif results != expected:
+            raise AssertionError('%s returns different results' % name)
+        print('%-28s %14.1f' % (name, latency))
+    print('(in-memory index loaded in %.2f s)' % index_load_time)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Counts the SQL queries and measures the time of the semantic route with the pictogram-synset database (PictoDB): with
+one lookup per synset (as before) and with the pictos of all synsets of a document looked up at once
+(PictoDB.prefetch), compared to the in-memory PictoIndex. The sentences are generated randomly from the synsets of the
+database (with female and plural morphology and synsets without pictos), so no spaCy model or GermaNet is needed. Checks
+that all give the same translation candidates. Run from the main folder of the project (with --db-file, e.g. on a copy
+migrated by picto_translator.picto_db_migration):
+
+    python benchmarks/bench_semantic_route.py [--sentences 200] [--words 12] [--db-file FILE]
+"""
+
+import argparse
+import ast
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.containers import Document, SentenceState, WordSynsets, WordTranslationCandidates  # noqa: E402
+from picto_translator.metrics import DB_QUERIES  # noqa: E402
+from picto_translator.picto_db import PICTO_DB_FILE, PictoDB, PictoIndex  # noqa: E402
+from picto_translator.semantic_route import SemanticRoute  # noqa: E402
+
+LexUnit = namedtuple('LexUnit', ['orthform'])
+Synset = namedtuple('Synset', ['id', 'lexunits'])
+
+
+def make_synset(synset_id):
+    return Synset(synset_id, (LexUnit(synset_id),))
+
+
+class Morph:
+
+    def __init__(self, morph_dict):
+        self.morph_dict = morph_dict
+
+    def to_dict(self):
+        return self.morph_dict
+
+
+class RandomToken:
+    """
+    Stands in for a spaCy token with random gender and number.
+    """
+
+    def __init__(self, rng):
+        self.morph = Morph({'Gender': rng.choice(['Fem', 'Masc']), 'Number': rng.choice(['Sing', 'Plur'])})
+        self.with_morph = rng.random() < 0.5
+
+    def has_morph(self):
+        return self.with_morph
+
+
+class RandomSentenceState(SentenceState):
+    """
+    Stands in for a SentenceState with n_words words, each with up to 6 random synsets. Complex pictos are found when
+    their head and dependent synsets are on consecutive words.
+    """
+
+    def __init__(self, n_words, synset_ids, complex_synsets, rng):
+        self.sentence = [RandomToken(rng) for _ in range(n_words)]
+        self.word_synsets = [WordSynsets() for _ in range(n_words)]
+        self.candidate_translations = [WordTranslationCandidates(str(i)) for i in range(n_words)]
+        for word_synsets in self.word_synsets:
+            word_synsets.synsets = [make_synset(rng.choice(synset_ids)) for _ in range(rng.randrange(7))]
+            word_synsets.penalties = [rng.choice([0, 7, 8, 16]) for _ in word_synsets.synsets]
+            word_synsets.antonym = [rng.random() < 0.05 for _ in word_synsets.synsets]
+        if n_words > 1 and rng.random() < 0.5:
+            synsets = rng.choice(complex_synsets)
+            start = rng.randrange(n_words - len(synsets) + 1) if len(synsets) <= n_words else None
+            if start is not None:
+                for i, synset_id in enumerate(synsets):
+                    self.word_synsets[start + i].synsets.append(make_synset(synset_id))
+                    self.word_synsets[start + i].penalties.append(0)
+                    self.word_synsets[start + i].antonym.append(False)
+        self.index_synsets()
+
+    def candidates(self):
+        return [(c.picto_paths, c.bw_picto_paths, c.penalties, c.translation_type, c.antonym_forms)
+                for c in self.candidate_translations]
+
+
+class PerSynsetPictoDB(PictoDB):
+    """
+    PictoDB without prefetching, i.e. with queries for each synset.
+    """
+
+    def prefetch(self, synset_ids):
+        return self
+
+
+def run(picto_db, documents):
+    """
+    Runs the semantic route on fresh copies of the documents and returns the translation candidates, the number of
+    queries and the time in ms per sentence.
+    """
+    semantic_route = SemanticRoute(use_picto_index=False)
+    semantic_route._picto_db = picto_db
+    n_queries = DB_QUERIES.get()
+    candidates = []
+    elapsed = 0
+    for make_document in documents:
+        doc = make_document()
+        start = time.perf_counter()
+        semantic_route.semantic_route(doc)
+        elapsed += time.perf_counter() - start
+        candidates.append([sentence_state.candidates() for sentence_state in doc.sentence_states])
+    n_sentences = sum(len(sentences) for sentences in candidates)
+    n_queries = DB_QUERIES.get() - n_queries
+    return candidates, n_queries / n_sentences, elapsed * 1000 / n_sentences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-file', default=os.path.join(ROOT, PICTO_DB_FILE))
+    parser.add_argument('--sentences', type=int, default=200)
+    parser.add_argument('--words', type=int, default=12)
+    parser.add_argument('--sentences-per-document', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    conn = PictoDB._create_connection(args.db_file)
+    synset_ids = [row[0] for row in conn.execute("SELECT synset_id FROM simple_pictos")]
+    complex_synsets = [[head] + sorted(ast.literal_eval(dependents)) for head, dependents in conn.execute(
+        "SELECT head_synset_id, dependent_synset_id FROM complex_pictos")]
+    conn.close()
+    synset_ids += ['s%d' % i for i in range(len(synset_ids))]
+
+    def document_factory(seed):
+        def make_document():
+            rng = random.Random(seed)
+            doc = Document('')
+            doc.sentence_states = [RandomSentenceState(args.words, synset_ids, complex_synsets, rng)
+                                   for _ in range(args.sentences_per_document)]
+            return doc
+        return make_document
+
+    documents = [document_factory(args.seed * 100003 + i)
+                 for i in range(max(1, args.sentences // args.sentences_per_document))]
+
+    expected = None
+    print('%-24s %20s %20s' % ('', 'queries per sentence', 'ms per sentence'))
+    for name, picto_db in (('query per synset', PerSynsetPictoDB(args.db_file)),
+                           ('prefetch per document', PictoDB(args.db_file)),
+                           ('in-memory index', PictoIndex(args.db_file))):
+        candidates, queries, latency = run(picto_db, documents)
+        if expected is None:
+            expected = candidates
+        elif candidates != expected:
+            raise AssertionError('%s returns different translation candidates' % name)
+        print('%-24s %20.1f %20.3f' % (name, queries, latency))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compares the start of a worker that loads the app itself (cold start) with the start of a worker forked from a master
+process that has preloaded the app (preload mode, cf. gunicorn.conf.py), without and with gc.freeze in the master. For
+1..N workers, reports the time until the first translation and the memory use: the sum of the RSS of N cold workers vs.
+the sum of the proportional set size (PSS, shared pages divided among the processes) of the master and N forked
+workers. Each forked worker runs a full garbage collection after its first translation, as a long-running worker
+eventually does. With --ram-mb, also recommends the number of workers that fit into that much memory (with 20%
+headroom, at most one per CPU). Linux only. Run from the main folder of the project:
+
+    python benchmarks/bench_startup.py [--workers 4] [--ram-mb 4096]
+"""
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SENTENCE = 'Die Kinder spielen mit dem Ball.'
+
+COLD_START = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, %r)
+import app
+app.translator.translate(%r)
+ready = time.perf_counter() - start
+with open('/proc/self/status') as status:
+    rss = [int(line.split()[1]) / 1024 for line in status if line.startswith('VmRSS:')][0]
+print(json.dumps({'ready_s': ready, 'rss_mb': rss}))
+''' % (ROOT, SENTENCE)
+
+
+def memory_mb():
+    """
+    Returns RSS, PSS and private memory of the current process in MB.
+    """
+    memory = dict()
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:', 'Private_Clean:', 'Private_Dirty:'):
+                memory[parts[0][:-1]] = int(parts[1]) / 1024
+    return {'rss': memory['Rss'], 'pss': memory['Pss'],
+            'private': memory['Private_Clean'] + memory['Private_Dirty']}
+
+
+def fork_workers(app, n_workers):
+    """
+    Forks n_workers workers from the current (preloaded) process; each worker translates a sentence and reports the time
+    since the fork and its memory. Returns the reports and the memory of the master while the workers are alive.
+    """
+    workers = []
+    for _ in range(n_workers):
+        read_fd, write_fd = os.pipe()
+        report_fd, done_fd = os.pipe()
+        fork_time = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            os.close(done_fd)
+            app.translator.translate(SENTENCE)
+            report = {'ready_ms': (time.perf_counter() - fork_time) * 1000}
+            # without gc.freeze, a full collection writes to the reference counts of all objects of the master
+            gc.collect()
+            report.update(memory_mb())
+            os.write(write_fd, json.dumps(report).encode())
+            os.close(write_fd)
+            os.read(report_fd, 1)  # stay alive until all workers have reported, so that pages stay shared
+            os._exit(0)
+        os.close(write_fd)
+        os.close(report_fd)
+        workers.append((pid, read_fd, done_fd))
+
+    reports = []
+    for _, read_fd, _ in workers:
+        reports.append(json.loads(os.read(read_fd, 4096).decode()))
+        os.close(read_fd)
+    master_memory = memory_mb()
+    for pid, _, done_fd in workers:
+        os.write(done_fd, b'x')
+        os.close(done_fd)
+        os.waitpid(pid, 0)
+    return reports, master_memory
+
+
+def measure_forked(app, max_workers):
+    """
+    Forks 1..max_workers workers from the current process and returns a list of (preload PSS MB, private MB per worker,
+    fork->ready ms) for each number of workers.
+    """
+    results = []
+    for n_workers in range(1, max_workers + 1):
+        reports, master_memory = fork_workers(app, n_workers)
+        results.append((master_memory['pss'] + sum(report['pss'] for report in reports),
+                        sum(report['private'] for report in reports) / n_workers,
+                        sum(report['ready_ms'] for report in reports) / n_workers))
+    return results
+
+
+def recommended_workers(ram_mb, shared_mb, private_mb):
+    """
+    Returns the number of workers whose memory (shared_mb once, private_mb per worker) fits into 80% of ram_mb, but at
+    most one per CPU, since translating is CPU-bound.
+    """
+    fitting = int((ram_mb * 0.8 - shared_mb) // private_mb) if private_mb > 0 else os.cpu_count()
+    return max(0, min(fitting, os.cpu_count()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--ram-mb', type=float, help='memory available to the app, to recommend a number of workers')
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    process = subprocess.run([sys.executable, '-c', COLD_START], capture_output=True, text=True, check=True)
+    cold = json.loads(process.stdout.strip().splitlines()[-1])
+    print('cold start:      %.2f s until first translation, RSS %.0f MB per worker' % (cold['ready_s'], cold['rss_mb']))
+
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import app
+    gc.collect()
+    print('preloaded master: %.2f s to load and warm up' % (time.perf_counter() - start))
+    not_frozen = measure_forked(app, args.workers)
+    gc.freeze()
+    print('gc.freeze: %d objects frozen' % gc.get_freeze_count())
+    frozen = measure_forked(app, args.workers)
+
+    print('%8s %12s %34s %34s' % ('', 'cold', 'preload without gc.freeze', 'preload with gc.freeze'))
+    print('%8s %12s %34s %34s' % ('workers', 'RSS MB', 'PSS MB / private MB / ready ms',
+                                  'PSS MB / private MB / ready ms'))
+    for n_workers, (without_freeze, with_freeze) in enumerate(zip(not_frozen, frozen), 1):
+        print('%8d %12.0f %34s %34s' % (n_workers, n_workers * cold['rss_mb'], '%.0f / %.1f / %.1f' % without_freeze,
+                                        '%.0f / %.1f / %.1f' % with_freeze))
+
+    if args.ram_mb:
+        # the memory of n forked workers is about the PSS with one worker plus the private memory of n - 1 workers
+        print('recommended workers for %.0f MB: cold %d, preload without gc.freeze %d, preload with gc.freeze %d' % (
+            args.ram_mb, recommended_workers(args.ram_mb, 0, cold['rss_mb']),
+            recommended_workers(args.ram_mb, not_frozen[0][0] - not_frozen[0][1], not_frozen[0][1]),
+            recommended_workers(args.ram_mb, frozen[0][0] - frozen[0][1], frozen[0][1])))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
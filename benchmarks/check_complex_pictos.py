@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checks that the complex pictograms found with the inverted synset index of the sentences
+(SemanticRoute._find_consecutive_synsets) are the same as with the previous search, which scanned all synsets of the
+sentence for every complex pictogram. The sentences and complex pictograms are generated randomly from a small set of
+synsets, so that synsets occur on several words and on the same word more than once; no spaCy model, GermaNet or
+database is needed. Also reports the time of both searches. Run from the main folder of the project:
+
+    python benchmarks/check_complex_pictos.py [--sentences 2000] [--words 20] [--synsets 40]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.containers import (ComplexPicto, SentenceState, WordSynsets,  # noqa: E402
+                                         WordTranslationCandidates)
+from picto_translator.semantic_route import SemanticRoute  # noqa: E402
+
+Synset = namedtuple('Synset', ['id'])
+
+
+class RandomSentenceState(SentenceState):
+    """
+    Stands in for a SentenceState with n_words words, each with up to max_synsets random synsets.
+    """
+
+    def __init__(self, n_words, synset_ids, max_synsets, rng):
+        self.word_synsets = [WordSynsets() for _ in range(n_words)]
+        self.candidate_translations = [WordTranslationCandidates(str(i)) for i in range(n_words)]
+        for word_synsets in self.word_synsets:
+            word_synsets.synsets = [Synset(rng.choice(synset_ids)) for _ in range(rng.randrange(max_synsets + 1))]
+            word_synsets.penalties = [rng.randrange(20) for _ in word_synsets.synsets]
+            word_synsets.antonym = [False for _ in word_synsets.synsets]
+        self.index_synsets()
+
+
+class ComplexPictos:
+    """
+    Stands in for the PictoIndex with the given complex pictos (head synset ID -> list of ComplexPicto).
+    """
+
+    def __init__(self, complex_pictos):
+        self.complex_pictos = complex_pictos
+
+    def get_complex_pictos(self, synset_id):
+        return self.complex_pictos.get(synset_id, [])
+
+
+def find_consecutive_synsets_by_scanning(sentence_state, complex_synsets):
+    """
+    The previous SemanticRoute._find_consecutive_synsets, which scans all synsets of the sentence.
+    """
+    double_synsets = dict()
+    all_word_synsets = [synset.id for word_synsets in sentence_state.word_synsets for synset in word_synsets.synsets]
+    for s in complex_synsets:
+        if all_word_synsets.count(s) > 1:
+            double_synsets[s] = [sentence_index
+                                 for sentence_index, word_synsets in enumerate(sentence_state.word_synsets)
+                                 for synset in word_synsets.synsets if synset.id == s]
+
+    matched_complex = []
+    sentence_indices = []
+    penalties = []
+
+    for word_index, word_synsets in enumerate(sentence_state.word_synsets):
+        for synset_index, candidate_synset in enumerate(word_synsets.synsets):
+            if candidate_synset.id in matched_complex:
+                continue
+
+            elif candidate_synset.id in complex_synsets:
+                matched_complex.append(candidate_synset.id)
+                sentence_indices.append(word_index)
+                penalties.append(word_synsets.penalties[synset_index])
+                break
+
+    if set(matched_complex) == set(complex_synsets):
+        if sorted(sentence_indices) == list(range(min(sentence_indices), max(sentence_indices) + 1)):
+            return sentence_indices, penalties
+
+        else:
+            for i, s in enumerate(sentence_indices):
+                synset = matched_complex[i]
+                if synset in double_synsets:
+                    other_sentence_indices = double_synsets[synset]
+                    for o in other_sentence_indices:
+                        sentence_indices[i] = o
+                        if sorted(sentence_indices) == list(range(min(sentence_indices), max(sentence_indices) + 1)):
+                            return sentence_indices, penalties
+            return None, None
+    else:
+        return None, None
+
+
+def find_all_complex_pictos(semantic_route, sentence_state, picto_db):
+    """
+    Runs the complex picto search of the semantic route for every synset of the sentence and returns the candidates.
+    """
+    for word_synsets in sentence_state.word_synsets:
+        for synset in word_synsets.synsets:
+            semantic_route._find_complex_pictos(synset, sentence_state, picto_db)
+    return [(c.picto_paths, c.penalties) for c in sentence_state.candidate_translations]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sentences', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=20)
+    parser.add_argument('--synsets', type=int, default=40, help='number of distinct synsets')
+    parser.add_argument('--max-synsets-per-word', type=int, default=6)
+    parser.add_argument('--complex-pictos', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    synset_ids = ['s%d' % i for i in range(args.synsets)]
+    complex_pictos = dict()
+    for i in range(args.complex_pictos):
+        head = rng.choice(synset_ids)
+        dependents = set(rng.sample(synset_ids, rng.randrange(1, 4)))
+        complex_pictos.setdefault(head, []).append(ComplexPicto(head, dependents, 'c%d.png' % i, 'c%d_bw.png' % i))
+    picto_db = ComplexPictos(complex_pictos)
+    sentence_states = [RandomSentenceState(rng.randrange(1, args.words + 1), synset_ids, args.max_synsets_per_word, rng)
+                       for _ in range(args.sentences)]
+
+    # the synsets of each complex picto (as searched by _find_complex_pictos) in all sentences
+    searches = [(sentence_state, list(complex_picto.dependent_synsets) + [head])
+                for sentence_state in sentence_states
+                for head, pictos in complex_pictos.items() for complex_picto in pictos]
+    semantic_route = SemanticRoute.__new__(SemanticRoute)
+
+    start = time.perf_counter()
+    expected = [find_consecutive_synsets_by_scanning(*search) for search in searches]
+    scanning_time = time.perf_counter() - start
+    start = time.perf_counter()
+    found = [semantic_route._find_consecutive_synsets(*search) for search in searches]
+    index_time = time.perf_counter() - start
+
+    n_failed = sum(1 for e, f in zip(expected, found) if e != f)
+    n_found = sum(1 for e in expected if e[0] is not None)
+    print('%d searches in %d sentences, %d complex pictos found, %d differences'
+          % (len(searches), len(sentence_states), n_found, n_failed))
+    print('scanning: %.1f µs per search, inverted index: %.1f µs per search'
+          % (scanning_time * 1e6 / len(searches), index_time * 1e6 / len(searches)))
+
+    # the candidates of whole sentences
+    n_sentences_failed = 0
+    for sentence_state in sentence_states[:200]:
+        candidates = find_all_complex_pictos(semantic_route, sentence_state, picto_db)
+        sentence_state.candidate_translations = [WordTranslationCandidates(c.token)
+                                                 for c in sentence_state.candidate_translations]
+        semantic_route_by_scanning = SemanticRoute.__new__(SemanticRoute)
+        semantic_route_by_scanning._find_consecutive_synsets = find_consecutive_synsets_by_scanning
+        if candidates != find_all_complex_pictos(semantic_route_by_scanning, sentence_state, picto_db):
+            n_sentences_failed += 1
+    print('%d sentences with different candidates' % n_sentences_failed)
+    return 1 if n_failed or n_sentences_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checks that the OptimalPathSearcher returns translations with the lowest possible cost: translates the regression
+corpus and compares the cost of the decoded path of every sentence with the lowest cost found by enumerating all paths
+through the lattice of its translation candidates (sentences with too many paths are skipped). Also reports the decoding
+time. Run from the main folder of the project:
+
+    python benchmarks/check_path_search.py [--max-paths 1000000]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.containers import Document  # noqa: E402
+from picto_translator.translator import Text2PictoTranslator  # noqa: E402
+
+
+def count_paths(lattice):
+    """
+    Returns the number of paths through the lattice.
+    """
+    counts = [0] * lattice.n_words + [1]
+    for start in range(lattice.n_words - 1, -1, -1):
+        counts[start] = sum(counts[edge.end] for edge in lattice.edges_from(start))
+    return counts[0]
+
+
+def enumerate_costs(lattice, start=0):
+    """
+    Yields the cost of every path through the lattice from the word position start.
+    """
+    if start == lattice.n_words:
+        yield 0
+        return
+    for edge in lattice.edges_from(start):
+        for cost in enumerate_costs(lattice, edge.end):
+            yield edge.cost + cost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join(ROOT, 'benchmarks', 'regression_corpus.txt'))
+    parser.add_argument('--max-paths', type=int, default=1000000)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    with open(args.corpus, encoding='utf-8') as corpus_file:
+        corpus = [line.strip() for line in corpus_file if line.strip()]
+
+    translator = Text2PictoTranslator()
+    searcher = translator._optimal_path_searcher
+    n_checked = n_skipped = n_failed = 0
+    decoding_time = 0
+    for line in corpus:
+        doc = Document(line)
+        doc.analysed_doc, doc.sentence_list = translator._linguistic_analyser.analyse(line)
+        translator._sentence_state_creator.create_sentence_states(doc)
+        translator._direct_path.direct_route(doc)
+        translator._semantic_path.semantic_route(doc)
+
+        for sentence_state in doc.sentence_states:
+            start = time.perf_counter()
+            lattice = searcher.get_lattice(sentence_state)
+            path = searcher._decode(lattice)
+            decoding_time += time.perf_counter() - start
+
+            n_paths = count_paths(lattice)
+            if n_paths > args.max_paths:
+                n_skipped += 1
+                continue
+            lowest_cost = min(enumerate_costs(lattice))
+            n_checked += 1
+            if path.cost != lowest_cost or sum(edge.cost for edge in path.edges()) != path.cost:
+                n_failed += 1
+                print('NOT OPTIMAL (cost %s, lowest %s): %s' % (path.cost, lowest_cost, sentence_state.sentence.text))
+
+    print('%d sentences checked against %s paths at most, %d skipped, %d not optimal; decoding %.2f ms in total'
+          % (n_checked, args.max_paths, n_skipped, n_failed, decoding_time * 1000))
+    return 1 if n_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Checks that dropping the synsets without pictograms before the semantic route (cf. SentenceStateCreator) does not
+change the translations: translates the regression corpus with and without pruning, compares the translations and the
+k best whole-sentence alternatives and reports the share of pruned synsets and the time per pass. Run from the main
+folder of the project:
+
+    python benchmarks/check_synset_pruning.py [--k-best 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from picto_translator.metrics import PRUNED_SYNSETS, SYNSETS  # noqa: E402
+from picto_translator.translator import Text2PictoTranslator  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.path.join(ROOT, 'benchmarks', 'regression_corpus.txt'))
+    parser.add_argument('--k-best', type=int, default=5)
+    args = parser.parse_args()
+
+    os.chdir(ROOT)
+    with open(args.corpus, encoding='utf-8') as corpus_file:
+        corpus = [line.strip() for line in corpus_file if line.strip()]
+
+    results = dict()
+    for prune_synsets in (False, True):
+        translator = Text2PictoTranslator(prune_synsets=prune_synsets)
+        # the GermaNet cache is shared by both translators, so it is filled before the first pass is timed
+        for line in corpus:
+            translator.translate(line)
+        n_synsets, n_pruned_synsets = SYNSETS.get(), PRUNED_SYNSETS.get()
+        start = time.perf_counter()
+        results[prune_synsets] = [translator.translate(line, k_best=args.k_best) for line in corpus]
+        elapsed = time.perf_counter() - start
+        print('%-16s %8.1f ms per line, %d synsets, %d pruned' % (
+            'pruned' if prune_synsets else 'not pruned', elapsed * 1000 / len(corpus), SYNSETS.get() - n_synsets,
+            PRUNED_SYNSETS.get() - n_pruned_synsets))
+
+    differences = [line for line, expected, found in zip(corpus, results[False], results[True]) if expected != found]
+    if differences:
+        print('%d lines translated differently, e.g. %s' % (len(differences), differences[:5]))
+        return 1
+    print('All %d lines translated the same.' % len(corpus))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+import gc
+import os
+import time
+
+# Preload mode (default): the app, i.e. all read-only resources (GermaNet, spaCy model, lookup dictionary and
+# pictogram-synset index), is loaded once in the master process and the workers are forked from it. After loading, all
+# objects are moved to the permanent generation of the garbage collector (gc.freeze), so that the collector of the
+# workers does not write to them and the memory pages stay shared between the workers (copy-on-write). Set
+# PICTO_PRELOAD=0 to load the app in every worker instead. See README.TXT for the memory profile.
+preload_app = os.environ.get('PICTO_PRELOAD', '1') == '1'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+
+def when_ready(server):
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+        server.log.info('Froze %d objects of the preloaded app before forking the workers', gc.get_freeze_count())
+
+
+def pre_fork(server, worker):
+    worker.fork_time = time.perf_counter()
+
+
+def post_worker_init(worker):
+    worker.log.info('Worker %s ready %.1f ms after fork', worker.pid, (time.perf_counter() - worker.fork_time) * 1000)
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import pandas as pd
+from collections import namedtuple
 
 
 class Document:
@@ -14,44 +14,74 @@ class Document:
         self.analysed_doc = None
         self.sentence_list = []
         self.sentence_states = []
+        self.n_synsets = 0  # synsets found for the words of the document
+        self.n_pruned_synsets = 0  # of these, synsets without pictograms, dropped by the SentenceStateCreator
+
+class GrammarConstraint:
+    """
+    Class objects store the grammatical constraints of a word in a lookup dictionary entry, i.e. the set of allowed
+    POS tags (tags, None if any tag is allowed) and the required morphological feature values (morph, tuple of
+    (feature, value) pairs). Objects are immutable.
+    """
+    __slots__ = ('tags', 'morph')
+
+    def __init__(self, tags=None, morph=()):
+        object.__setattr__(self, 'tags', tags)
+        object.__setattr__(self, 'morph', morph)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('GrammarConstraint objects are immutable')
+
+    def matches(self, tag, morph_dict):
+        """
+        Returns True if the POS tag and the morphological analysis (dict as returned by spaCy's MorphAnalysis.to_dict())
+        of a word fulfil the constraints. The morphology is only checked if the word has a morphological analysis.
+        """
+        if self.tags is not None and tag not in self.tags:
+            return False
+        if morph_dict:
+            for feature, value in self.morph:
+                if morph_dict.get(feature) != value:
+                    return False
+        return True
+
+
+class DictionaryEntry:
+    """
+    Class objects store a single-word entry of the lookup dictionary with its grammatical constraints (a
+    GrammarConstraint) and its (black-and-white) pictogram; a missing black-and-white pictogram is None.
+    """
+    __slots__ = ('constraint', 'picto', 'picto_bw')
+
+    def __init__(self, constraint, picto, picto_bw):
+        self.constraint = constraint
+        self.picto = picto
+        self.picto_bw = picto_bw
+
 
 class MultiWord:
     """
-    Class objects store all multi-word expressions found in the lookup dictionary with their pictograms, info on whether
-    the words have to be concatenated in the input (concat) and grammatical info (tags, morph).
+    Class objects store all multi-word expressions found in the lookup dictionary with their pictograms and grammatical
+    info, i.e. a GrammarConstraint for each of the words of the expression.
     """
 
-    def __init__(self, multiword_list, picto_path, tags_entry, morph_entry):
+    def __init__(self, multiword_list, picto_path, constraints):
         self.multiword = multiword_list
         self.picto_path = picto_path
-        self.tags = []
-        self.morph = []
-
-        if pd.isna(tags_entry) is False:
-            tags_dict = eval(tags_entry)  # interpret str as dict
-            tags_dict = {k.lower(): v for k, v in tags_dict.items()}
-            for word in self.multiword:
-                if word in tags_dict.keys():
-                    self.tags.append(tags_dict[word])
-                else:
-                    self.tags.append(None)
-
-        else:
-            for _ in self.multiword:
-                self.tags.append(None)
-
-        if pd.isna(morph_entry) is False:
-            morph_dict = eval(morph_entry)  # interpret str as dict
-            morph_dict = {k.lower(): v for k, v in morph_dict.items()}
-            for word in self.multiword:
-                if word in morph_dict.keys():
-                    self.morph.append(morph_dict[word])
-                else:
-                    self.morph.append(None)
-
-        else:
-            for _ in self.multiword:
-                self.morph.append(None)
+        self.constraints = constraints
+
+
+class ComplexPicto:
+    """
+    Class that stores a complex pictogram (i.e. a pictogram translating more than one word) of the pictogram-synset
+    database with its head synset, the set of dependent synsets and the paths of its (black-and-white) pictogram.
+    """
+
+    def __init__(self, head_synset_id, dependent_synsets, picto_path, bw_picto_path):
+        self.head_synset_id = head_synset_id
+        self.dependent_synsets = dependent_synsets
+        self.picto_path = picto_path
+        self.bw_picto_path = bw_picto_path
 
 
 class SentenceState:
@@ -62,8 +92,23 @@ class SentenceState:
     def __init__(self, analysed_sentence):
         self.sentence_string = analysed_sentence.text
         self.sentence = analysed_sentence
+        self.morph = [word.morph.to_dict() for word in self.sentence]
         self.word_synsets = [WordSynsets() for _ in self.sentence]
         self.candidate_translations = [WordTranslationCandidates(word) for word in self.sentence]
+        self.lattice = None  # built from candidate_translations by the OptimalPathSearcher
+        self.synset_positions = None  # inverted index of word_synsets, built by index_synsets()
+
+    def index_synsets(self):
+        """
+        Builds the inverted index of the synsets of the sentence: synset ID -> list of (word index, synset index) of all
+        occurrences of the synset in word_synsets, sorted by word index. Called once the synsets of all words are found.
+        """
+        synset_positions = dict()
+        for word_index, word_synsets in enumerate(self.word_synsets):
+            for synset_index, synset in enumerate(word_synsets.synsets):
+                synset_positions.setdefault(synset.id, []).append((word_index, synset_index))
+        self.synset_positions = synset_positions
+        return synset_positions
 
 
 class WordSynsets:
@@ -90,9 +135,10 @@ class WordTranslationCandidates:
         self.penalties = []
         self.translation_type = []  # each item ∈ {'simple', 'complex'}
         self.antonym = []  # each item ∈ {True, False}
+        self.antonym_forms = []  # surface form of the antonym shown by the pictogram if antonym is True, else None
         self.bw_picto_paths = []
 
-    def add_candidate(self, picto_path, penalty, translation_type, is_antonym, bw_picto_path):
+    def add_candidate(self, picto_path, penalty, translation_type, is_antonym, bw_picto_path, antonym_form=None):
         """
         Adds a translation candidate to the class.
         """
@@ -101,4 +147,69 @@ class WordTranslationCandidates:
             self.penalties.append(penalty)
             self.translation_type.append(translation_type)
             self.antonym.append(is_antonym)
+            self.antonym_forms.append(antonym_form)
             self.bw_picto_paths.append(bw_picto_path)
+
+
+class TokenRecord(namedtuple('TokenRecord', ['text', 'lemma_', 'tag_', 'is_punct'])):
+    """
+    Lightweight copy of the attributes of a spaCy token that are used after the translation. Unlike spaCy tokens, it
+    does not keep the analysed document alive and can be pickled, so that translations can be cached and shared.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_token(cls, token):
+        return cls(token.text, token.lemma_, token.tag_, token.is_punct)
+
+    def __str__(self):
+        return self.text
+
+
+class TranslatedSpan:
+    """
+    Class that stores the words (TokenRecords) translated by one pictogram of a translation and, if the pictogram is in
+    antonymic relation with the words, the surface form of the antonym (e.g. 'hoch' for 'tief'), which is shown as
+    'nicht hoch'. Iterating over a TranslatedSpan yields its words. Objects are immutable.
+    """
+    __slots__ = ('tokens', 'antonym')
+
+    def __init__(self, tokens, antonym=None):
+        object.__setattr__(self, 'tokens', tuple(tokens))
+        object.__setattr__(self, 'antonym', antonym)
+
+    @classmethod
+    def from_tokens(cls, tokens, antonym=None):
+        """
+        Returns the TranslatedSpan of spaCy tokens; words given as strings (e.g. the negation marker) are kept.
+        """
+        return cls([token if isinstance(token, str) else TokenRecord.from_token(token) for token in tokens], antonym)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('TranslatedSpan objects are immutable')
+
+    def __getstate__(self):
+        return self.tokens, self.antonym
+
+    def __setstate__(self, state):
+        object.__setattr__(self, 'tokens', state[0])
+        object.__setattr__(self, 'antonym', state[1])
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, index):
+        return self.tokens[index]
+
+    def __eq__(self, other):
+        return isinstance(other, TranslatedSpan) and (self.tokens, self.antonym) == (other.tokens, other.antonym)
+
+    def __hash__(self):
+        return hash((self.tokens, self.antonym))
+
+    def __repr__(self):
+        return 'TranslatedSpan(%r, %r)' % (self.tokens, self.antonym)
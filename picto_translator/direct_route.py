@@ -1,50 +1,60 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import ast
 import pandas as pd
 import re
+from collections import defaultdict
 
-from .containers import MultiWord
+from .containers import DictionaryEntry, GrammarConstraint, MultiWord
+
+DICTIONARY_FILE = 'static/data/dictionary.csv'
 
 
 class DirectRoute:
     """
     Class that translates along the direct route, i.e. using a lookup dictionary and morphological information, to
-    translate to pictographs
+    translate to pictographs. The grammatical constraints (tag and morph columns) of the lookup dictionary are
+    validated and compiled into GrammarConstraint objects when loading the dictionary; malformed entries raise a
+    ValueError.
     """
 
     def __init__(self):
-        self.lookup_dict = pd.read_csv('static/data/dictionary.csv')
-        self.multiword_tokens, self.multiword_tokens_bw = self._collect_multiwords('token')
-        self.multiword_lemmas, self.multiword_lemmas_bw = self._collect_multiwords('lemma')
+        self.lookup_dict = pd.read_csv(DICTIONARY_FILE)
+        self.multiword_tokens, self.multiword_tokens_bw, self.multiword_token_trie = self._collect_multiwords('token')
+        self.multiword_lemmas, self.multiword_lemmas_bw, self.multiword_lemma_trie = self._collect_multiwords('lemma')
+        self.singleword_tokens = self._collect_singlewords('token')
+        self.singleword_lemmas = self._collect_singlewords('lemma')
 
     def _collect_multiwords(self, column):
         """"
         Returns all lookup dictionary entries consisting of more than one token / lemma in a dict having as the key the
         multi-word expression (tokens in tuple) and as the value a MultiWord object. Options for column are ['token', 'lemma'].
-        The dict is sorted by the number of tokens in the multi-word expressions (from large to small).
+        The dict is sorted by the number of tokens in the multi-word expressions (from large to small). Also returns a
+        MultiWordTrie of the multi-word expressions to find them in a sentence.
         """
         multiword_tokens = dict()
         multiword_tokens_bw = dict()
         multiword_row_indices = []
 
-        for row_index, row in enumerate(self.lookup_dict.iterrows()):
-            if pd.isna(row[1][column]) is False:
+        for row_index, row in self.lookup_dict.iterrows():
+            if pd.isna(row[column]) is False:
                 # if bw is True:
-                #     if pd.isna(row[1]['picto_bw']) is True:
+                #     if pd.isna(row['picto_bw']) is True:
                 #         continue
-                split_token = row[1][column].split(' ')
+                split_token = row[column].split(' ')
                 split_token = tuple([token.lower() for token in split_token])
                 if len(split_token) > 1:
                     multiword_row_indices.append(row_index)
-                    multiword_token = MultiWord(split_token, row[1]['picto'], row[1]['tag'], row[1]['morph'])
+                    constraints = self._compile_multiword_constraints(split_token, row['tag'], row['morph'], row_index)
+                    multiword_token = MultiWord(split_token, row['picto'], constraints)
                     multiword_tokens[split_token] = multiword_token
-                    if pd.isna(row[1]['picto_bw']) is False:
-                        multiword_token_bw = MultiWord(split_token, row[1]['picto_bw'], row[1]['tag'], row[1]['morph'])
+                    if pd.isna(row['picto_bw']) is False:
+                        multiword_token_bw = MultiWord(split_token, row['picto_bw'], constraints)
                         multiword_tokens_bw[split_token] = multiword_token_bw
 
+        # the index is kept to refer to the rows of the csv file in error messages
         self.lookup_dict.drop(multiword_row_indices, inplace=True)
-        self.lookup_dict.reset_index(drop=True, inplace=True)
 
         # sort by length of multiword
         sorted_multiword_tokens = dict()
@@ -55,7 +65,102 @@ class DirectRoute:
         for k in sorted(multiword_tokens_bw, key=len, reverse=True):
             sorted_multiword_tokens_bw[k] = multiword_tokens_bw[k]
 
-        return sorted_multiword_tokens, sorted_multiword_tokens_bw
+        return sorted_multiword_tokens, sorted_multiword_tokens_bw, MultiWordTrie(sorted_multiword_tokens)
+
+    def _collect_singlewords(self, column):
+        """
+        Returns all remaining (i.e. single-word) lookup dictionary entries in a dict having as the key the token / lemma
+        and as the value the list of its DictionaryEntry objects in the order of the lookup dictionary. Options for
+        column are ['token', 'lemma']. Has to be called after _collect_multiwords().
+        """
+        singlewords = defaultdict(list)
+        for row in self.lookup_dict.itertuples():
+            key = getattr(row, column)
+            if pd.isna(key) is False:
+                constraint = self._compile_constraint(row.tag, row.morph, row.Index)
+                picto_bw = None if pd.isna(row.picto_bw) else row.picto_bw
+                singlewords[key].append(DictionaryEntry(constraint, row.picto, picto_bw))
+        return dict(singlewords)
+
+    @staticmethod
+    def _parse_literal(entry, expected_type, row_index, column):
+        """
+        Interprets a str of the lookup dictionary as a Python literal of the expected type (dict or set) without
+        evaluating any code. Raises a ValueError pointing to the row of the csv file if the entry is malformed.
+        """
+        try:
+            value = ast.literal_eval(entry)
+        except (ValueError, SyntaxError):
+            value = None
+        if not isinstance(value, expected_type):
+            raise ValueError('Malformed %s entry %r in row %d of the lookup dictionary: expected a %s.'
+                             % (column, entry, row_index + 2, expected_type.__name__))
+        return value
+
+    @classmethod
+    def _compile_tags(cls, tags, row_index):
+        """
+        Returns the frozenset of allowed tags of a tag entry (a single tag or a set of tags).
+        """
+        if isinstance(tags, str) and '{' not in tags:
+            tags = {tags}
+        elif isinstance(tags, str):
+            tags = cls._parse_literal(tags, set, row_index, 'tag')
+        if not isinstance(tags, set) or not all(isinstance(tag, str) for tag in tags):
+            raise ValueError('Malformed tag entry %r in row %d of the lookup dictionary: expected a tag or a set of tags.'
+                             % (tags, row_index + 2))
+        return frozenset(tags)
+
+    @staticmethod
+    def _compile_morph(morph, row_index):
+        """
+        Returns the tuple of required (feature, value) pairs of a morph dict.
+        """
+        if not all(isinstance(feature, str) and isinstance(value, str) for feature, value in morph.items()):
+            raise ValueError('Malformed morph entry %r in row %d of the lookup dictionary: expected feature-value pairs '
+                             'of str.' % (morph, row_index + 2))
+        return tuple(morph.items())
+
+    @classmethod
+    def _compile_constraint(cls, tag_entry, morph_entry, row_index):
+        """
+        Returns the GrammarConstraint of a single-word entry of the lookup dictionary.
+        """
+        tags = None
+        morph = ()
+        if pd.isna(tag_entry) is False:
+            tags = cls._compile_tags(tag_entry, row_index)
+        if pd.isna(morph_entry) is False:
+            morph = cls._compile_morph(cls._parse_literal(morph_entry, dict, row_index, 'morph'), row_index)
+        return GrammarConstraint(tags, morph)
+
+    @classmethod
+    def _compile_multiword_constraints(cls, multiword, tag_entry, morph_entry, row_index):
+        """
+        Returns a list with the GrammarConstraint of each word of a multi-word entry of the lookup dictionary. The tag
+        and morph entries of multi-word expressions are dicts with (some of) the words as keys.
+        """
+        tags_dict = dict()
+        morph_dict = dict()
+        if pd.isna(tag_entry) is False:
+            tags_dict = cls._parse_literal(tag_entry, dict, row_index, 'tag')
+        if pd.isna(morph_entry) is False:
+            morph_dict = cls._parse_literal(morph_entry, dict, row_index, 'morph')
+
+        for column, entry_dict in [('tag', tags_dict), ('morph', morph_dict)]:
+            for word in entry_dict:
+                if not isinstance(word, str) or word.lower() not in multiword:
+                    raise ValueError('Malformed %s entry in row %d of the lookup dictionary: %r is not a word of %r.'
+                                     % (column, row_index + 2, word, ' '.join(multiword)))
+
+        tags_dict = {word.lower(): cls._compile_tags(tags, row_index) for word, tags in tags_dict.items()}
+        for word, morph in morph_dict.items():
+            if not isinstance(morph, dict):
+                raise ValueError('Malformed morph entry in row %d of the lookup dictionary: expected a dict for %r.'
+                                 % (row_index + 2, word))
+        morph_dict = {word.lower(): cls._compile_morph(morph, row_index) for word, morph in morph_dict.items()}
+
+        return [GrammarConstraint(tags_dict.get(word), morph_dict.get(word, ())) for word in multiword]
 
     def _multiword_searcher(self, sentence_state, word_type):
         """
@@ -66,142 +171,65 @@ class DirectRoute:
             sentence_list = [word.lower_ for word in sentence_state.sentence]
             multiword_dict = self.multiword_tokens
             multiword_dict_bw = self.multiword_tokens_bw
+            multiword_trie = self.multiword_token_trie
 
         else:
             sentence_list = [word.lemma_.lower() for word in sentence_state.sentence]
             multiword_dict = self.multiword_lemmas
             multiword_dict_bw = self.multiword_lemmas_bw
+            multiword_trie = self.multiword_lemma_trie
+
+        # find all consecutive occurrences of multi-word expressions in one pass over the sentence; the matches are
+        # handled in the order of the multi-word dict, i.e. longest multi-word expressions first
+        correspondences = dict()
+        for _, start, multiword_str in sorted(multiword_trie.find_matches(sentence_list)):
+            if multiword_str not in correspondences:
+                correspondences[multiword_str] = self._check_multiword_grammatical_correspondence(
+                    sentence_state, multiword_dict[multiword_str], word_type)
+            if correspondences[multiword_str] is False:
+                continue
+
+            multiword = multiword_dict[multiword_str]
+            if multiword.multiword in multiword_dict_bw.keys():
+                bw_picto = multiword_dict_bw[multiword_str].picto_path
+            else:
+                bw_picto = None
 
-        for multiword_str in multiword_dict.keys():
-            # check if sentence has all of multi-word token or lemma
-            if all(word in sentence_list for word in multiword_str):
-                corresponds = self._check_multiword_grammatical_correspondence(sentence_state.sentence,
-                                                                               multiword_dict[multiword_str], word_type)
-                if corresponds is False:
-                    continue
-
-                else:
-                    multiword = multiword_dict[multiword_str]
-                    if multiword.multiword in multiword_dict_bw.keys():
-                        bw_picto = multiword_dict_bw[multiword_str].picto_path
-                    else:
-                        bw_picto = None
-
-
-                    # check if words are next to each other
-                    for index, sentence_word in enumerate(sentence_list):
-                        if sentence_word == multiword.multiword[0]:
-                            if sentence_list[index:index + len(multiword.multiword)] == list(multiword.multiword):
-                                for word in multiword.multiword:
-                                    sentence_state.candidate_translations[sentence_list.index(word)].add_candidate(
-                                        multiword.picto_path, -8, 'complex', False, bw_picto)
+            # add the candidate to the words of this occurrence, so that they form one consecutive span in the lattice
+            # of the OptimalPathSearcher (the first occurrence of a word in the sentence may be elsewhere)
+            for word_index in range(start, start + len(multiword.multiword)):
+                sentence_state.candidate_translations[word_index].add_candidate(
+                    multiword.picto_path, -8, 'complex', False, bw_picto)
 
         return sentence_state
 
-    def _check_multiword_grammatical_correspondence(self, sentence_list, multiword, word_type):
+    @staticmethod
+    def _check_multiword_grammatical_correspondence(sentence_state, multiword, word_type):
         """
-        Returns True if all feature values and the POS-tag specified in the dataframe entry correspond with the
+        Returns True if all feature values and the POS-tag specified in the dictionary entry correspond with the
         multi-words' morphological analysis. Options for word_type are ['token', 'lemma'].
         """
-        for word in sentence_list:
+        for word, morph_dict in zip(sentence_state.sentence, sentence_state.morph):
             if word_type == 'lemma':
                 check = word.lemma_.lower()
             else:
                 check = word.lower_
             if check in multiword.multiword:
                 multiword_word_index = multiword.multiword.index(check)
-                corresponds = self._check_grammatical_correspondence(word, multiword.tags[multiword_word_index],
-                                                                     multiword.morph[multiword_word_index])
-                if corresponds is False:
+                if multiword.constraints[multiword_word_index].matches(word.tag_, morph_dict) is False:
                     return False
         return True
 
-    @staticmethod
-    def _check_morph(token_morph, df_morph):
-        """
-        Returns True if all feature values specified in dataframe entry correspond with the token's morphological
-        analysis
-        """
-        if not type(df_morph) is dict:
-            df_morph = eval(df_morph)  # interpret str as dict
-
-        token_morph = token_morph.to_dict()
-
-        # If we get through the for loop, then all features specified in dataframe correspond with the features of the
-        # input token.
-        for feature in df_morph:
-            try:
-                df_value = df_morph[feature]
-                token_value = token_morph[feature]
-                if df_value == token_value:
-                    continue
-                else:
-                    return False
-            except KeyError:
-                return False
-        return True
-
-    @staticmethod
-    def _check_tags(token_tag, df_tag):
-        """
-        Returns True if the token tag specified in the dataframe entry corresponds with the token's tag
-        """
-        if '{' in df_tag:
-            df_tag = eval(df_tag)
-        if isinstance(df_tag, str):
-            if token_tag == df_tag:
-                return True
-        elif isinstance(df_tag, set):
-            if token_tag in df_tag:
-                return True
-        else:
-            return False
-
-    def _check_grammatical_correspondence(self, word, tag_entry, morph_entry):
-        """
-        Returns True if all feature values and the POS-tag specified in the dataframe entry correspond with the token's
-        morphological analysis
-        """
-        # string -> multi-word
-        if type(tag_entry) is str:
-            tag_corresponds = self._check_tags(word.tag_, tag_entry)
-        # pandas cell -> single-word
-        elif pd.isna(tag_entry) is False:
-            tag_corresponds = self._check_tags(word.tag_, tag_entry)
-        # None or empty pandas cell
-        else:
-            tag_corresponds = True
-
-        # dict -> multiword
-        if type(morph_entry) is dict and len(word.morph.to_dict()) != 0:
-            morph_corresponds = self._check_morph(word.morph, morph_entry)
-        # pandas cell -> single-word
-        elif pd.isna(morph_entry) is False and len(word.morph.to_dict()) != 0:
-            morph_corresponds = self._check_morph(word.morph, morph_entry)
-        # None or empty pandas cell
-        else:
-            morph_corresponds = True
-
-        if morph_corresponds is True and tag_corresponds is True:
-            return True
-        else:
-            return False
-
     def _singleword_searcher(self, sentence_state, word_type):
         """
         Adds WordTranslationCandidates of matched single-word tokens or lemmas.
         """
         if word_type == 'token':
             for word_index, word in enumerate(sentence_state.sentence):
-                for entry in self.lookup_dict[self.lookup_dict['token'] == word.lower_].iterrows():
-                    corresponds = self._check_grammatical_correspondence(word, entry[1]['tag'], entry[1]['morph'])
-                    if corresponds is True:
-                        if pd.isna(entry[1]['picto_bw']):
-                            sentence_state.candidate_translations[word_index].add_candidate(entry[1]['picto'], -8,
-                                                                                            'simple', False, None)
-                        else:
-                            sentence_state.candidate_translations[word_index].add_candidate(
-                                entry[1]['picto'], -8, 'simple', False, entry[1]['picto_bw'])
+                for entry in self.singleword_tokens.get(word.lower_, ()):
+                    if entry.constraint.matches(word.tag_, sentence_state.morph[word_index]):
+                        sentence_state.candidate_translations[word_index].add_candidate(entry.picto, -8, 'simple',
+                                                                                        False, entry.picto_bw)
 
         elif word_type == 'lemma':
             for word_index, word in enumerate(sentence_state.sentence):
@@ -212,15 +240,10 @@ class DirectRoute:
                         word.text = word.text[1:]
                         word.lemma_ = word.lemma_[1:]
 
-                for entry in self.lookup_dict[self.lookup_dict['lemma'] == word.lemma_.lower()].iterrows():
-                    corresponds = self._check_grammatical_correspondence(word, entry[1]['tag'], entry[1]['morph'])
-                    if corresponds is True:
-                        if pd.isna(entry[1]['picto_bw']):
-                            sentence_state.candidate_translations[word_index].add_candidate(entry[1]['picto'], -8,
-                                                                                            'simple', False, None)
-                        else:
-                            sentence_state.candidate_translations[word_index].add_candidate(
-                                entry[1]['picto'], -8, 'simple', False, entry[1]['picto_bw'])
+                for entry in self.singleword_lemmas.get(word.lemma_.lower(), ()):
+                    if entry.constraint.matches(word.tag_, sentence_state.morph[word_index]):
+                        sentence_state.candidate_translations[word_index].add_candidate(entry.picto, -8, 'simple',
+                                                                                        False, entry.picto_bw)
 
         return sentence_state
 
@@ -252,3 +275,38 @@ class DirectRoute:
 
         return doc
 
+
+class MultiWordTrie:
+    """
+    Token-level trie of the multi-word expressions of the lookup dictionary. Used in DirectRoute to find all consecutive
+    occurrences of multi-word expressions in a sentence with a single pass over the sentence.
+    """
+
+    def __init__(self, multiword_dict):
+        self._root = dict()
+        # each node is a dict word -> child node; the key None holds the (rank, multi-word expression) ending in the
+        # node, rank being the position of the multi-word expression in multiword_dict
+        self._max_length = 0
+        for rank, multiword_str in enumerate(multiword_dict):
+            node = self._root
+            for word in multiword_str:
+                node = node.setdefault(word, dict())
+            node[None] = (rank, multiword_str)
+            self._max_length = max(self._max_length, len(multiword_str))
+
+    def find_matches(self, sentence_list):
+        """
+        Returns (rank, start index, multi-word expression) for all consecutive occurrences of multi-word expressions in
+        the list of (lower-cased) words.
+        """
+        matches = []
+        for start in range(len(sentence_list)):
+            node = self._root
+            for word in sentence_list[start:start + self._max_length]:
+                node = node.get(word)
+                if node is None:
+                    break
+                if None in node:
+                    rank, multiword_str = node[None]
+                    matches.append((rank, start, multiword_str))
+        return matches
@@ -1,21 +1,87 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+from collections import namedtuple
+
 from germanetpy.germanet import Germanet
 from germanetpy.synset import WordCategory
 
+from .cache import LRUCache
+from .germanet_snapshot import (GERMANET_SNAPSHOT_DIR, GERMANET_XML_DIR, GermaNetSnapshot, HypernymClosure,
+                                load_germanet)
+
+
+# stands in for a spaCy token when prewarming the cache, the search only uses the lemma and the tag of a word
+LemmaTag = namedtuple('LemmaTag', ['lemma_', 'tag_'])
+
 
 class GermaNet:
     """
-    Class to load, store and search GermaNet.
+    Class to load, store and search GermaNet. Hypernyms are searched up to hypernym_levels levels up in the hypernym
+    closure of the synsets, which is read from the snapshot or computed once when GermaNet is loaded. With
+    stop_synset_ids (e.g. the synsets with pictograms, cf. picto_db.read_picto_synset_ids), the hypernyms of the
+    hypernyms with these IDs are not searched.
     """
 
-    def __init__(self):
-        self.germanet = Germanet('static/data/GN_V160/GN_V160/GN_V160_XML')
+    def __init__(self, use_snapshot=True, xml_dir=GERMANET_XML_DIR, snapshot_dir=GERMANET_SNAPSHOT_DIR,
+                 cache_size=20000, hypernym_levels=3, stop_synset_ids=None):
+        # the snapshot (cf. germanet_snapshot.py) loads in milliseconds and is rebuilt when the XML files change
+        if use_snapshot:
+            self.germanet = load_germanet(xml_dir, snapshot_dir)
+        else:
+            self.germanet = Germanet(xml_dir)
+        if isinstance(self.germanet, GermaNetSnapshot):
+            self.hypernym_closure = self.germanet.get_hypernym_closure(hypernym_levels, stop_synset_ids)
+        else:
+            self.hypernym_closure = HypernymClosure.from_germanet(self.germanet, hypernym_levels, stop_synset_ids)
+        self.cache = LRUCache(cache_size)
+        # the settings that determine the search results (cf. Text2PictoTranslator.settings)
+        self.settings = {'snapshot': isinstance(self.germanet, GermaNetSnapshot), 'hypernym_levels': hypernym_levels,
+                         'stop_at_pictos': stop_synset_ids is not None}
 
     def get_synsets_and_penalties(self, word, separable_verb=None):
         """
-        Returns all synsets, their penalties and antonymic relation connected to the search word.
+        Returns all synsets, their penalties and antonymic relation connected to the search word. The results are cached
+        per lemma, separable verb and tag and returned as tuples, since they are shared between all callers.
+        """
+        key = (word.lemma_, separable_verb, word.tag_)
+        result = self.cache.get(key)
+        if result is None:
+            synsets, penalties, is_antonym = self._search_synsets_and_penalties(word, separable_verb)
+            result = (tuple(synsets), tuple(penalties), tuple(is_antonym))
+            self.cache.put(key, result)
+        return result
+
+    def prewarm(self, frequency_list_file):
+        """
+        Fills the cache with the results for the most frequent words of a frequency list, i.e. a UTF-8 text file with a
+        lemma and its tag per line, separated by a tab and sorted by descending frequency (further columns, e.g. counts,
+        are ignored). Returns the number of words searched.
+        """
+        n_words = 0
+        with open(frequency_list_file, encoding='utf-8') as frequency_list:
+            for line in frequency_list:
+                columns = line.rstrip('\n').split('\t')
+                if len(columns) < 2 or not columns[0]:
+                    continue
+                if n_words >= self.cache.maxsize:
+                    break
+                self.get_synsets_and_penalties(LemmaTag(columns[0], columns[1]))
+                n_words += 1
+        return n_words
+
+    def get_antonym_synset_ids(self):
+        """
+        Returns the IDs of all synsets that are in an antonymic relation with another synset, i.e. that can be found by
+        _search_antonyms.
+        """
+        return {found_lexunit.synset.id for synset in self.germanet.synsets.values() for lexunit in synset.lexunits
+                for relation, found_lexunits in lexunit.relations.items() if 'antonym' in str(relation)
+                for found_lexunit in found_lexunits}
+
+    def _search_synsets_and_penalties(self, word, separable_verb=None):
+        """
+        Searches all synsets, their penalties and antonymic relation connected to the search word.
         """
         if separable_verb is not None:
             search_word = separable_verb
@@ -50,7 +116,7 @@ class GermaNet:
             penalties.append(0)
 
         # add hypernyms, antonyms, xpos synsets
-        hypernyms, h_penalty = self._search_hypernyms(direct_synsets, 3)
+        hypernyms, h_penalty = self._search_hypernyms(direct_synsets)
         antonyms, a_penalty = self._search_antonyms(direct_synsets)
         xpos, x_penalty = self._search_xpos(direct_synsets)
 
@@ -80,24 +146,16 @@ class GermaNet:
             return False
 
 
-    @staticmethod
-    def _search_hypernyms(synsets, hypernym_levels):
+    def _search_hypernyms(self, synsets):
         """
-        Searches hypernyms and their penalties of input word's synsets. hypernym_levels refers to how many hypernymic
-        levels should be considered.
+        Searches hypernyms and their penalties of input word's synsets in the hypernym closure, i.e. up to
+        hypernym_levels levels up. Each hypernym is found once, with the penalty of its lowest level (8 per level).
         """
         found_hypernyms = []
         penalties = []
-        for i in range(hypernym_levels):
-            if i == 0:
-                hypernyms = [hypernym for synset in synsets for hypernym in synset.direct_hypernyms]
-                found_hypernyms += hypernyms
-                penalties += [8 for _ in hypernyms]
-            else:
-                # hypernyms of hypernyms
-                hypernyms = [hypernym for synset in hypernyms for hypernym in synset.direct_hypernyms]
-                found_hypernyms += hypernyms
-                penalties += [(i + 1) * 8 for _ in hypernyms]
+        for hypernym, level in self.hypernym_closure.get_hypernyms(synsets):
+            found_hypernyms.append(hypernym)
+            penalties.append(level * 8)
 
         return found_hypernyms, penalties
 
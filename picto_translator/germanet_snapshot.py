@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Compact, memory-mappable snapshot of the parts of GermaNet the translator needs: orthographic forms and their synsets,
+word categories and direct hypernyms of the synsets, the lexical units of the synsets and their antonymy, pertainymy and
+participle relations, and the hypernym closure of the synsets (cf. build_hypernym_closure). The snapshot is a folder of
+int-indexed numpy arrays (.npy) plus a meta.json file recording the fingerprint of the XML files it was built from.
+Loading it takes milliseconds instead of parsing the XML files.
+
+To build (or rebuild) the snapshot and check that it yields the same results as the XML files, run from the main folder:
+
+    python -m picto_translator.germanet_snapshot [--verify]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+from germanetpy.synset import WordCategory
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+GERMANET_XML_DIR = 'static/data/GN_V160/GN_V160/GN_V160_XML'
+GERMANET_SNAPSHOT_DIR = 'static/data/germanet_snapshot'
+
+# lexical relations used by GermaNet._search_antonyms and GermaNet._search_xpos
+SNAPSHOT_RELATIONS = ('antonym', 'pertainym', 'participle')
+WORD_CATEGORIES = ('adj', 'nomen', 'verben')
+# number of hypernym levels of the hypernym closure stored in the snapshot; deeper closures are computed when loading
+SNAPSHOT_HYPERNYM_DEPTH = 6
+
+
+def xml_fingerprint(xml_dir):
+    """
+    Returns a fingerprint of the XML files in xml_dir (names, sizes and modification times).
+    """
+    fingerprint = hashlib.sha1()
+    for file_name in sorted(os.listdir(xml_dir)):
+        if file_name.endswith('.xml'):
+            stat = os.stat(os.path.join(xml_dir, file_name))
+            fingerprint.update(('%s:%d:%d;' % (file_name, stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+    return fingerprint.hexdigest()
+
+
+def read_meta(snapshot_dir):
+    """
+    Returns the meta data of the snapshot in snapshot_dir or None if there is no (readable) snapshot.
+    """
+    try:
+        with open(os.path.join(snapshot_dir, 'meta.json'), encoding='utf-8') as meta_file:
+            return json.load(meta_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _string_table(strings):
+    """
+    Encodes a list of strings as one UTF-8 byte array and an array of offsets (string i is blob[offsets[i]:offsets[i+1]]).
+    """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(string) for string in encoded], dtype=np.int64)
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _csr(lists, dtype=np.int32):
+    """
+    Encodes a list of integer lists as an array of values and an array of offsets (compressed sparse rows).
+    """
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(values) for values in lists], dtype=np.int64)
+    values = np.fromiter((value for values in lists for value in values), dtype=dtype, count=int(offsets[-1]))
+    return values, offsets
+
+
+def build_hypernym_closure(hypernyms, hypernym_offsets, max_depth, stop=None):
+    """
+    Computes the hypernym closure of all synsets from their direct hypernyms (compressed sparse rows of synset indices):
+    the hypernyms of each synset up to max_depth levels up, each once with the lowest level at which it is found, in
+    breadth-first order (i.e. by level, and within a level in the order of walking the direct hypernyms level by
+    level). If stop (boolean array by synset index) is given, the hypernyms of the hypernyms marked in it are not
+    searched. Returns the arrays of hypernym indices, levels and offsets (compressed sparse rows).
+    """
+    stop = stop.tolist() if stop is not None else None
+    hypernyms = hypernyms.tolist()
+    hypernym_offsets = hypernym_offsets.tolist()
+    closure = []
+    for synset in range(len(hypernym_offsets) - 1):
+        found = dict()  # hypernym -> level, in the order the hypernyms are found
+        level = [synset]
+        for depth in range(1, max_depth + 1):
+            next_level = []
+            for s in level:
+                for hypernym in hypernyms[hypernym_offsets[s]:hypernym_offsets[s + 1]]:
+                    if hypernym not in found:
+                        found[hypernym] = depth
+                        if stop is None or not stop[hypernym]:
+                            next_level.append(hypernym)
+            if len(next_level) == 0:
+                break
+            level = next_level
+        closure.append(found)
+    closure_hypernyms, closure_offsets = _csr([list(found) for found in closure])
+    closure_depths, _ = _csr([list(found.values()) for found in closure], dtype=np.int8)
+    return closure_hypernyms, closure_depths, closure_offsets
+
+
+def build_snapshot(germanet, snapshot_dir, fingerprint):
+    """
+    Writes the snapshot of a germanetpy Germanet object to snapshot_dir. The snapshot is written to a temporary folder
+    first and then moved into place, so that a reader never sees a half-written snapshot.
+    """
+    synsets = list(germanet.synsets.values())
+    synset_index = {id(synset): i for i, synset in enumerate(synsets)}
+    lexunits = [lexunit for synset in synsets for lexunit in synset.lexunits]
+    lexunit_index = {id(lexunit): i for i, lexunit in enumerate(lexunits)}
+
+    # orthographic forms, sorted by their UTF-8 encoding so that they can be searched by bisection
+    orthforms = sorted(germanet.orthform2lexid, key=lambda form: form.encode('utf-8'))
+    orthform_synsets = [[synset_index[id(synset)] for synset in germanet.get_synsets_by_orthform(form)]
+                        for form in orthforms]
+
+    relation_names = sorted({str(relation) for lexunit in lexunits for relation in lexunit.relations
+                             if any(name in str(relation) for name in SNAPSHOT_RELATIONS)})
+    relation_codes = {name: code for code, name in enumerate(relation_names)}
+    lexunit_relations = []
+    for lexunit in lexunits:
+        relations = []
+        for relation, related_lexunits in lexunit.relations.items():
+            if str(relation) in relation_codes:
+                relations += [(relation_codes[str(relation)], lexunit_index[id(related)])
+                              for related in related_lexunits]
+        lexunit_relations.append(relations)
+
+    arrays = dict()
+    arrays['synset_id_blob'], arrays['synset_id_offsets'] = _string_table([synset.id for synset in synsets])
+    arrays['synset_category'] = np.array([WORD_CATEGORIES.index(synset.word_category.name) for synset in synsets],
+                                         dtype=np.int8)
+    arrays['synset_lexunits'], arrays['synset_lexunit_offsets'] = _csr(
+        [[lexunit_index[id(lexunit)] for lexunit in synset.lexunits] for synset in synsets])
+    arrays['synset_hypernyms'], arrays['synset_hypernym_offsets'] = _csr(
+        [[synset_index[id(hypernym)] for hypernym in synset.direct_hypernyms] for synset in synsets])
+    arrays['hypernym_closure'], arrays['hypernym_closure_depths'], arrays['hypernym_closure_offsets'] = \
+        build_hypernym_closure(arrays['synset_hypernyms'], arrays['synset_hypernym_offsets'], SNAPSHOT_HYPERNYM_DEPTH)
+    arrays['lexunit_orthform_blob'], arrays['lexunit_orthform_offsets'] = _string_table(
+        [lexunit.orthform for lexunit in lexunits])
+    arrays['lexunit_synset'] = np.array([synset_index[id(lexunit.synset)] for lexunit in lexunits], dtype=np.int32)
+    arrays['lexunit_relation_codes'], arrays['lexunit_relation_offsets'] = _csr(
+        [[code for code, _ in relations] for relations in lexunit_relations], dtype=np.int8)
+    arrays['lexunit_relation_targets'], _ = _csr(
+        [[target for _, target in relations] for relations in lexunit_relations])
+    arrays['orthform_blob'], arrays['orthform_offsets'] = _string_table(orthforms)
+    arrays['orthform_synsets'], arrays['orthform_synset_offsets'] = _csr(orthform_synsets)
+
+    meta = {'version': SNAPSHOT_VERSION, 'fingerprint': fingerprint, 'relation_names': relation_names,
+            'n_synsets': len(synsets), 'n_lexunits': len(lexunits), 'n_orthforms': len(orthforms),
+            'hypernym_closure_depth': SNAPSHOT_HYPERNYM_DEPTH}
+
+    parent_dir = os.path.dirname(os.path.abspath(snapshot_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.germanet_snapshot_', dir=parent_dir)
+    try:
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), array)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as meta_file:
+            json.dump(meta, meta_file, indent=1)
+
+        old_dir = None
+        if os.path.exists(snapshot_dir):
+            old_dir = tempfile.mkdtemp(prefix='.germanet_snapshot_old_', dir=parent_dir)
+            os.rename(snapshot_dir, os.path.join(old_dir, 'snapshot'))
+        os.rename(tmp_dir, snapshot_dir)
+        if old_dir is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return meta
+
+
+class _StringTable:
+    """
+    Read-only access to strings stored with _string_table.
+    """
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def get_bytes(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+    def __getitem__(self, i):
+        return self.get_bytes(i).decode('utf-8')
+
+    def find(self, string):
+        """
+        Returns the index of the string in a table sorted by UTF-8 encoding, or None if it is not in the table.
+        """
+        encoded = string.encode('utf-8')
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_bytes(middle) < encoded:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self) and self.get_bytes(low) == encoded:
+            return low
+        return None
+
+
+class HypernymClosure:
+    """
+    Hypernym closure of all synsets (cf. build_hypernym_closure) up to max_depth levels, as compact arrays indexed by
+    synset index. get_index and get_synset map synset objects to their indices and back. If the arrays hold more levels
+    than max_depth (e.g. those of the snapshot), the deeper hypernyms are dropped once when the closure is created.
+    """
+
+    def __init__(self, hypernyms, depths, offsets, max_depth, get_index, get_synset):
+        if len(depths) > 0 and depths.max() > max_depth:
+            keep = depths <= max_depth
+            kept_offsets = np.zeros(len(keep) + 1, dtype=np.int64)
+            kept_offsets[1:] = np.cumsum(keep, dtype=np.int64)
+            hypernyms, depths, offsets = hypernyms[keep], depths[keep], kept_offsets[offsets]
+        self._hypernyms = hypernyms
+        self._depths = depths
+        self._offsets = offsets
+        self.max_depth = max_depth
+        self._get_index = get_index
+        self._get_synset = get_synset
+
+    def get_row(self, index):
+        """
+        Returns the hypernyms of the synset with the given index as a list of (hypernym index, level).
+        """
+        start, end = self._offsets[index:index + 2].tolist()
+        return list(zip(self._hypernyms[start:end].tolist(), self._depths[start:end].tolist()))
+
+    def get_hypernyms(self, synsets):
+        """
+        Returns the hypernyms of the synsets as a list of (hypernym synset, level): each hypernym once with the lowest
+        level at which it is found from any of the synsets, ordered by level and, within a level, by synset.
+        """
+        rows = [self.get_row(self._get_index(synset)) for synset in synsets]
+        if len(rows) == 1:
+            row = rows[0]
+        else:
+            # sorted is stable, so that the hypernyms of one level stay in the order of the synsets
+            row = dict()
+            for hypernym, depth in sorted((item for row in rows for item in row), key=lambda item: item[1]):
+                row.setdefault(hypernym, depth)
+            row = row.items()
+        return [(self._get_synset(hypernym), depth) for hypernym, depth in row]
+
+    @classmethod
+    def from_germanet(cls, germanet, max_depth, stop_synset_ids=None):
+        """
+        Computes the hypernym closure of a germanetpy Germanet object. The hypernyms of the hypernyms with IDs in
+        stop_synset_ids are not searched.
+        """
+        synsets = list(germanet.synsets.values())
+        synset_index = {id(synset): i for i, synset in enumerate(synsets)}
+        hypernyms, hypernym_offsets = _csr(
+            [[synset_index[id(hypernym)] for hypernym in synset.direct_hypernyms] for synset in synsets])
+        stop = None
+        if stop_synset_ids is not None:
+            stop = np.array([synset.id in stop_synset_ids for synset in synsets], dtype=bool)
+        return cls(*build_hypernym_closure(hypernyms, hypernym_offsets, max_depth, stop), max_depth,
+                   lambda synset: synset_index[id(synset)], synsets.__getitem__)
+
+
+class SnapshotSynset:
+    """
+    Synset read from a GermaNet snapshot, with the attributes of a germanetpy Synset used by the translator.
+    """
+
+    __slots__ = ('_snapshot', '_index', 'id', 'word_category')
+
+    def __init__(self, snapshot, index):
+        self._snapshot = snapshot
+        self._index = index
+        self.id = snapshot.synset_ids[index]
+        self.word_category = WordCategory[WORD_CATEGORIES[snapshot.arrays['synset_category'][index]]]
+
+    def __repr__(self):
+        return 'Synset(id=%s, lexunits=%s)' % (self.id, ', '.join(lexunit.orthform for lexunit in self.lexunits))
+
+    @property
+    def lexunits(self):
+        return self._snapshot.get_lexunits(self._index)
+
+    @property
+    def direct_hypernyms(self):
+        return self._snapshot.get_hypernyms(self._index)
+
+
+class SnapshotLexUnit:
+    """
+    Lexical unit read from a GermaNet snapshot, with the attributes of a germanetpy Lexunit used by the translator.
+    Only the antonymy, pertainymy and participle relations are available.
+    """
+
+    __slots__ = ('_snapshot', '_index', 'orthform')
+
+    def __init__(self, snapshot, index):
+        self._snapshot = snapshot
+        self._index = index
+        self.orthform = snapshot.lexunit_orthforms[index]
+
+    def __repr__(self):
+        return 'Lexunit(id=%s, orthform=%s)' % (self._index, self.orthform)
+
+    @property
+    def synset(self):
+        return self._snapshot.get_synset(int(self._snapshot.arrays['lexunit_synset'][self._index]))
+
+    @property
+    def relations(self):
+        return self._snapshot.get_relations(self._index)
+
+
+class GermaNetSnapshot:
+    """
+    GermaNet loaded from a snapshot. The arrays are memory-mapped; synset and lexical unit objects are created on first
+    access and then reused, so that the results of two searches can be compared with "is" like germanetpy objects.
+    """
+
+    def __init__(self, snapshot_dir):
+        self.meta = read_meta(snapshot_dir)
+        if self.meta is None or self.meta.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('No valid GermaNet snapshot (version %d) in %s' % (SNAPSHOT_VERSION, snapshot_dir))
+        self.arrays = dict()
+        for file_name in os.listdir(snapshot_dir):
+            if file_name.endswith('.npy'):
+                self.arrays[file_name[:-4]] = np.load(os.path.join(snapshot_dir, file_name), mmap_mode='r')
+
+        self.synset_ids = _StringTable(self.arrays['synset_id_blob'], self.arrays['synset_id_offsets'])
+        self.lexunit_orthforms = _StringTable(self.arrays['lexunit_orthform_blob'],
+                                              self.arrays['lexunit_orthform_offsets'])
+        self.orthforms = _StringTable(self.arrays['orthform_blob'], self.arrays['orthform_offsets'])
+        self.relation_names = self.meta['relation_names']
+        self._synsets = dict()
+        self._lexunits = dict()
+
+    def get_synsets_by_orthform(self, form):
+        """
+        Returns a list of synsets with a lexical unit of the given orthographic form.
+        """
+        i = self.orthforms.find(form)
+        if i is None:
+            return []
+        return self._get_row('orthform_synsets', 'orthform_synset_offsets', i, self.get_synset)
+
+    @property
+    def synsets(self):
+        """
+        Returns a dictionary synset ID -> synset of all synsets (like germanetpy's Germanet.synsets).
+        """
+        return {self.synset_ids[i]: self.get_synset(i) for i in range(len(self.synset_ids))}
+
+    def get_synset(self, index):
+        try:
+            return self._synsets[index]
+        except KeyError:
+            synset = self._synsets[index] = SnapshotSynset(self, index)
+            return synset
+
+    def get_lexunit(self, index):
+        try:
+            return self._lexunits[index]
+        except KeyError:
+            lexunit = self._lexunits[index] = SnapshotLexUnit(self, index)
+            return lexunit
+
+    def get_lexunits(self, synset_index):
+        return self._get_row('synset_lexunits', 'synset_lexunit_offsets', synset_index, self.get_lexunit)
+
+    def get_hypernyms(self, synset_index):
+        return self._get_row('synset_hypernyms', 'synset_hypernym_offsets', synset_index, self.get_synset)
+
+    def get_hypernym_closure(self, max_depth, stop_synset_ids=None):
+        """
+        Returns the HypernymClosure of the synsets up to max_depth levels, read from the snapshot if it holds enough
+        levels and computed otherwise, e.g. if the hypernyms of the hypernyms with IDs in stop_synset_ids are not
+        searched.
+        """
+        arrays = self.arrays
+        if self.meta.get('hypernym_closure_depth', 0) >= max_depth and stop_synset_ids is None:
+            closure = arrays['hypernym_closure'], arrays['hypernym_closure_depths'], arrays['hypernym_closure_offsets']
+        else:
+            logger.info('Computing the hypernym closure of GermaNet with %d levels', max_depth)
+            stop = None
+            if stop_synset_ids is not None:
+                stop = np.array([self.synset_ids[i] in stop_synset_ids for i in range(len(self.synset_ids))],
+                                dtype=bool)
+            closure = build_hypernym_closure(arrays['synset_hypernyms'], arrays['synset_hypernym_offsets'], max_depth,
+                                             stop)
+        return HypernymClosure(*closure, max_depth, lambda synset: synset._index, self.get_synset)
+
+    def get_relations(self, lexunit_index):
+        """
+        Returns the relations of a lexical unit as a dictionary relation name -> list of related lexical units.
+        """
+        start, end = self.arrays['lexunit_relation_offsets'][lexunit_index:lexunit_index + 2]
+        relations = dict()
+        for code, target in zip(self.arrays['lexunit_relation_codes'][start:end].tolist(),
+                                self.arrays['lexunit_relation_targets'][start:end].tolist()):
+            relations.setdefault(self.relation_names[code], []).append(self.get_lexunit(target))
+        return relations
+
+    def _get_row(self, values, offsets, i, get_object):
+        start, end = self.arrays[offsets][i:i + 2]
+        return [get_object(index) for index in self.arrays[values][start:end].tolist()]
+
+
+def load_germanet(xml_dir=GERMANET_XML_DIR, snapshot_dir=GERMANET_SNAPSHOT_DIR):
+    """
+    Returns GermaNet loaded from the snapshot in snapshot_dir. If there is no snapshot or if the XML files in xml_dir
+    have changed since it was built, the XML files are parsed and the snapshot is rebuilt first. If the XML files are
+    not available, an existing snapshot is used as it is.
+    """
+    from germanetpy.germanet import Germanet
+
+    meta = read_meta(snapshot_dir)
+    if not os.path.isdir(xml_dir):
+        if meta is not None and meta.get('version') == SNAPSHOT_VERSION:
+            logger.info('GermaNet XML files not found in %s, using snapshot %s', xml_dir, snapshot_dir)
+            return GermaNetSnapshot(snapshot_dir)
+        raise FileNotFoundError('Neither GermaNet XML files in %s nor a snapshot in %s' % (xml_dir, snapshot_dir))
+
+    fingerprint = xml_fingerprint(xml_dir)
+    if meta is not None and meta.get('version') == SNAPSHOT_VERSION and meta.get('fingerprint') == fingerprint:
+        return GermaNetSnapshot(snapshot_dir)
+
+    logger.info('Building GermaNet snapshot %s from %s', snapshot_dir, xml_dir)
+    germanet = Germanet(xml_dir)
+    try:
+        build_snapshot(germanet, snapshot_dir, fingerprint)
+    except OSError as e:
+        logger.warning('Could not write GermaNet snapshot to %s (%s), using XML files', snapshot_dir, e)
+        return germanet
+    return GermaNetSnapshot(snapshot_dir)
+
+
+def verify_snapshot(germanet, snapshot):
+    """
+    Compares the snapshot with the germanetpy Germanet object it was built from for every orthographic form. Returns a
+    list of the forms with different results.
+    """
+    def synset_ids(synsets):
+        return sorted(synset.id for synset in synsets)
+
+    def relation_ids(lexunit):
+        return sorted((str(relation), related.synset.id) for relation, related_lexunits in lexunit.relations.items()
+                      for related in related_lexunits if any(name in str(relation) for name in SNAPSHOT_RELATIONS))
+
+    def describe(synset):
+        return (synset.id, synset.word_category, synset_ids(synset.direct_hypernyms),
+                [(lexunit.orthform, relation_ids(lexunit)) for lexunit in synset.lexunits])
+
+    def hypernym_ids(closure, synsets):
+        return [(hypernym.id, depth) for hypernym, depth in closure.get_hypernyms(synsets)]
+
+    expected_closure = HypernymClosure.from_germanet(germanet, SNAPSHOT_HYPERNYM_DEPTH)
+    found_closure = snapshot.get_hypernym_closure(SNAPSHOT_HYPERNYM_DEPTH)
+    differences = []
+    for form in list(germanet.orthform2lexid):
+        expected_synsets = germanet.get_synsets_by_orthform(form)
+        found_synsets = snapshot.get_synsets_by_orthform(form)
+        expected = sorted(describe(synset) for synset in expected_synsets)
+        found = sorted(describe(synset) for synset in found_synsets)
+        if expected != found or (sorted(hypernym_ids(expected_closure, expected_synsets))
+                                 != sorted(hypernym_ids(found_closure, found_synsets))):
+            differences.append(form)
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--xml-dir', default=GERMANET_XML_DIR)
+    parser.add_argument('--snapshot-dir', default=GERMANET_SNAPSHOT_DIR)
+    parser.add_argument('--verify', action='store_true', help='compare the snapshot with the XML files')
+    args = parser.parse_args()
+
+    from germanetpy.germanet import Germanet
+
+    germanet = Germanet(args.xml_dir)
+    meta = build_snapshot(germanet, args.snapshot_dir, xml_fingerprint(args.xml_dir))
+    print('Wrote %s: %d synsets, %d lexical units, %d orthographic forms' % (
+        args.snapshot_dir, meta['n_synsets'], meta['n_lexunits'], meta['n_orthforms']))
+
+    if args.verify:
+        differences = verify_snapshot(germanet, GermaNetSnapshot(args.snapshot_dir))
+        if differences:
+            print('%d forms differ, e.g. %s' % (len(differences), differences[:10]))
+            return 1
+        print('Snapshot and XML files yield the same results.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,14 +4,26 @@
 import spacy
 
 
+# The translator only uses the tags, lemmas, morphological features, dependencies (separable verbs), sentence
+# boundaries and punctuation flags of the spaCy analysis. A profile lists the spaCy pipeline and what is excluded from it
+# when loading. The vector table cannot be excluded: the tok2vec of de_core_news_lg uses the static vectors.
+ANALYSER_PROFILES = {
+    'full': {'model': 'de_core_news_lg', 'exclude': []},
+    'lean': {'model': 'de_core_news_lg', 'exclude': ['ner']},
+}
+
 
 class LinguisticAnalyser:
     """
-    Class that stores spaCy model for shallow linguistic analysis
+    Class that stores spaCy model for shallow linguistic analysis. The profile (cf. ANALYSER_PROFILES) determines which
+    components of the spaCy pipeline are loaded.
     """
 
-    def __init__(self):
-        self._nlp = spacy.load("de_core_news_lg")
+    def __init__(self, profile='lean'):
+        if profile not in ANALYSER_PROFILES:
+            raise ValueError('Invalid analyser profile. Expected one of: %s' % list(ANALYSER_PROFILES))
+        self.profile = profile
+        self._nlp = spacy.load(ANALYSER_PROFILES[profile]['model'], exclude=ANALYSER_PROFILES[profile]['exclude'])
 
 
     def analyse(self, string):
@@ -20,6 +32,14 @@ class LinguisticAnalyser:
         """
         analysed_doc = self._nlp(string)
         return analysed_doc, [sentence for sentence in analysed_doc.sents]
+
+    def analyse_batch(self, strings, batch_size=64, n_process=1):
+        """
+        Analyses several input strings at once with spaCy's nlp.pipe and yields the spaCy Doc object and the sentences
+        of each input string (in the order of the input strings).
+        """
+        for analysed_doc in self._nlp.pipe(strings, batch_size=batch_size, n_process=n_process):
+            yield analysed_doc, [sentence for sentence in analysed_doc.sents]
     
 
 
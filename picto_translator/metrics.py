@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Process-wide metrics of the translator: counters and latency histograms, written in the Prometheus text format by the
+/metrics route of the web app. Every process (e.g. gunicorn worker) has its own metrics. The time of each stage of a
+translation is observed in the histogram picto_stage_seconds (cf. timed); the stage times of the requests handled by a
+thread can also be collected per request, e.g. for the Server-Timing header (cf. start_request_timings).
+"""
+
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# upper bounds (in seconds) of the buckets of the latency histograms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# upper bounds of the buckets of histograms of counts (e.g. of synsets per request)
+COUNT_BUCKETS = (0, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# quantiles of the recent observations of a histogram that are exported besides the buckets
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"')
+                                          .replace('\n', '\\n')) for name, value in labels)
+
+
+class Counter:
+    """
+    Thread-safe counter, optionally with one label (e.g. the cache that is counted).
+    """
+
+    type = 'counter'
+
+    def __init__(self, name, help_text, label_name=None):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self._values = dict() if label_name else {None: 0}  # label value (None without label) -> count
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, label_value=None):
+        """
+        Adds amount to the count (of the label value) and returns the new count.
+        """
+        with self._lock:
+            value = self._values[label_value] = self._values.get(label_value, 0) + amount
+        return value
+
+    def get(self, label_value=None):
+        return self._values.get(label_value, 0)
+
+    def samples(self):
+        """
+        Returns the exported samples as a list of (name, labels, value), labels being a tuple of (name, value).
+        """
+        with self._lock:
+            values = sorted(self._values.items(), key=lambda item: str(item[0]))
+        return [(self.name, ((self.label_name, label_value),) if self.label_name else (), value)
+                for label_value, value in values]
+
+
+class CallbackCounter(Counter):
+    """
+    Counter whose values are read from other objects when the metrics are exported, e.g. the counters of an LRUCache.
+    callback returns the count or, with a label, a dict label value -> count.
+    """
+
+    def __init__(self, name, help_text, callback, label_name=None):
+        super().__init__(name, help_text, label_name)
+        self.callback = callback
+
+    def inc(self, amount=1, label_value=None):
+        raise TypeError('%s is read from a callback and cannot be incremented' % self.name)
+
+    def samples(self):
+        values = self.callback()
+        if self.label_name is None:
+            return [(self.name, (), values)]
+        return [(self.name, ((self.label_name, label_value),), value)
+                for label_value, value in sorted(values.items(), key=lambda item: str(item[0]))]
+
+
+class Histogram:
+    """
+    Thread-safe histogram of observed values (e.g. latencies in seconds), optionally with one label. Counts the
+    observations per bucket (cumulative in the export, as Prometheus expects) and keeps the last window observations per
+    label value, from which the quantiles (p50, p95, p99) are computed.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name, help_text, label_name=None, buckets=LATENCY_BUCKETS, window=1024):
+        self.name = name
+        self.help_text = help_text
+        self.label_name = label_name
+        self.buckets = tuple(buckets)
+        self.window = window
+        self._series = dict()  # label value -> [bucket counts (last one: +Inf), sum, recent observations]
+        self._lock = threading.Lock()
+
+    def observe(self, value, label_value=None):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0, deque(maxlen=self.window)]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2].append(value)
+
+    def quantiles(self, label_value=None):
+        """
+        Returns a dict quantile -> value of the recent observations (empty if there are none).
+        """
+        with self._lock:
+            series = self._series.get(label_value)
+            recent = sorted(series[2]) if series is not None else []
+        if len(recent) == 0:
+            return dict()
+        return {q: recent[min(int(q * len(recent)), len(recent) - 1)] for q in QUANTILES}
+
+    def samples(self):
+        with self._lock:
+            series = sorted(((label_value, list(counts), total)
+                             for label_value, (counts, total, _) in self._series.items()), key=lambda item: str(item[0]))
+        samples = []
+        for label_value, counts, total in series:
+            labels = ((self.label_name, label_value),) if self.label_name else ()
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((self.name + '_bucket', labels + (('le', _format_value(float(bound))),), cumulative))
+            samples.append((self.name + '_sum', labels, total))
+            samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+    def quantile_samples(self):
+        """
+        Returns the quantiles of the recent observations of all label values as samples.
+        """
+        with self._lock:
+            label_values = sorted(self._series, key=str)
+        samples = []
+        for label_value in label_values:
+            labels = ((self.label_name, label_value),) if self.label_name else ()
+            for q, value in self.quantiles(label_value).items():
+                samples.append((self.name + '_recent', labels + (('quantile', str(q)),), value))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Registry of the metrics of the process, exported together in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._metrics = dict()
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Registers a metric and returns it; a metric registered again under the same name replaces the former one.
+        """
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, label_name=None):
+        return self.register(Counter(name, help_text, label_name))
+
+    def callback_counter(self, name, help_text, callback, label_name=None):
+        return self.register(CallbackCounter(name, help_text, callback, label_name))
+
+    def histogram(self, name, help_text, label_name=None, buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, label_name, buckets))
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def to_prometheus(self):
+        """
+        Returns all metrics in the Prometheus text exposition format (version 0.0.4). The quantiles of the recent
+        observations of a histogram are exported as the gauge <name>_recent with the label quantile.
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append('# HELP %s %s' % (metric.name, metric.help_text))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            lines += ['%s%s %s' % (name, _format_labels(labels), _format_value(value))
+                      for name, labels, value in metric.samples()]
+            if isinstance(metric, Histogram):
+                lines.append('# HELP %s_recent Quantiles of the last %d observations of %s' % (
+                    metric.name, metric.window, metric.name))
+                lines.append('# TYPE %s_recent gauge' % metric.name)
+                lines += ['%s%s %s' % (name, _format_labels(labels), _format_value(value))
+                          for name, labels, value in metric.quantile_samples()]
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram('picto_stage_seconds', 'Time of the stages of the translation in seconds', 'stage')
+DB_QUERIES = registry.counter('picto_db_queries_total', 'SQL queries run by PictoDB lookups')
+DECODER_NODES = registry.counter('picto_decoder_nodes_total',
+                                 'Word positions expanded by the path search (viterbi) and the k-best search', 'decoder')
+DECODER_EDGES = registry.counter('picto_decoder_edges_total', 'Lattice edges relaxed by the path search')
+SYNSETS = registry.counter('picto_synsets_total', 'Synsets found for the words of the translated lines')
+PRUNED_SYNSETS = registry.counter('picto_synsets_pruned_total',
+                                  'Synsets without pictograms dropped before the semantic route')
+
+_request_timings = threading.local()
+
+
+def start_request_timings():
+    """
+    Starts collecting the times of the stages timed by the current thread, e.g. at the start of a request.
+    """
+    _request_timings.timings = dict()
+
+
+def stop_request_timings():
+    """
+    Stops collecting the stage times of the current thread and returns them as a dict stage -> seconds (in the order
+    the stages were first timed), or None if start_request_timings was not called.
+    """
+    timings = getattr(_request_timings, 'timings', None)
+    _request_timings.timings = None
+    return timings
+
+
+@contextmanager
+def timed(stage):
+    """
+    Context manager observing the time of the code block in picto_stage_seconds with the given stage (and adding it
+    to the stage times of the request, if they are collected).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage)
+        timings = getattr(_request_timings, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + duration
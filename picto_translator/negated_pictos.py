@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Negated variants of pictograms, i.e. pictograms with the red "nicht/kein" cross drawn on top, for translations of words
+in antonymic relation with a pictogram. The variants are rendered in memory and cached as encoded PNG bytes, so that no
+file is written while translating. To pre-render the negated variants of all pictograms that can be reached through
+an antonymic relation in GermaNet (written next to the pictograms as <name>_negated.png), run from the main folder:
+
+    python -m picto_translator.negated_pictos
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+from PIL import Image
+
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+PICTO_DIR = 'static/data'
+NEGATION_OVERLAY = 'METACOM_Symbole/Symbole_PNG/PNG_ohne_Rahmen/Kleine_Worte/nichtkein.png'
+
+
+def negated_picto_path(picto_path):
+    """
+    Returns the path of the (pre-rendered) negated variant of a pictogram.
+    """
+    return picto_path.replace('.png', '_negated.png')
+
+
+class NegatedPictoCache:
+    """
+    Renders the negated variants of pictograms and keeps the encoded PNG bytes and their ETag in an LRU cache. A variant
+    pre-rendered by the batch command is read from disk instead of being rendered. The overlay is loaded once, when the
+    first variant is rendered.
+    """
+
+    def __init__(self, picto_dir=PICTO_DIR, cache_size=512):
+        self.picto_dir = os.path.realpath(picto_dir)
+        self.cache = LRUCache(cache_size)
+        self._overlay = None
+        self._overlay_lock = threading.Lock()
+
+    def _get_overlay(self):
+        with self._overlay_lock:
+            if self._overlay is None:
+                with Image.open(os.path.join(self.picto_dir, NEGATION_OVERLAY)) as overlay:
+                    self._overlay = overlay.convert('RGBA')
+            return self._overlay
+
+    def _resolve(self, picto_path):
+        """
+        Returns the absolute file path of a pictogram, or None if it is not a PNG file inside the pictogram folder.
+        """
+        file_path = os.path.realpath(os.path.join(self.picto_dir, picto_path))
+        if not file_path.startswith(self.picto_dir + os.sep) or not file_path.endswith('.png'):
+            return None
+        if not os.path.isfile(file_path):
+            return None
+        return file_path
+
+    def render(self, picto_path):
+        """
+        Returns the negated variant of a pictogram as PNG bytes.
+        """
+        file_path = self._resolve(picto_path)
+        if file_path is None:
+            raise FileNotFoundError(picto_path)
+        with Image.open(file_path) as image:
+            negated = image.convert('RGBA')
+        overlay = self._get_overlay()
+        negated.paste(overlay, (0, 0), overlay)
+        output = io.BytesIO()
+        negated.save(output, format='PNG')
+        return output.getvalue()
+
+    def get(self, picto_path):
+        """
+        Returns the negated variant of a pictogram as PNG bytes and its ETag, or (None, None) if there is no such
+        pictogram.
+        """
+        cached = self.cache.get(picto_path)
+        if cached is not None:
+            return cached
+
+        file_path = self._resolve(picto_path)
+        if file_path is None:
+            return None, None
+        try:
+            with open(negated_picto_path(file_path), 'rb') as negated_file:
+                data = negated_file.read()
+        except FileNotFoundError:
+            data = self.render(picto_path)
+
+        cached = (data, hashlib.sha1(data).hexdigest())
+        self.cache.put(picto_path, cached)
+        return cached
+
+    def write(self, picto_path):
+        """
+        Renders the negated variant of a pictogram and writes it next to the pictogram. The file is written to a
+        temporary file first and then renamed, so that concurrent readers and writers never see a partial file.
+        """
+        data = self.render(picto_path)
+        target = negated_picto_path(self._resolve(picto_path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.negated_', suffix='.png', dir=os.path.dirname(target))
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(data)
+            os.replace(tmp_path, target)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return target
+
+
+def antonym_reachable_pictos(germanet, picto_index):
+    """
+    Returns the paths of all pictograms (colour and black-and-white, all versions) of the synsets that are in an
+    antonymic relation with another synset, i.e. of all pictograms that can be negated in a translation.
+    """
+    return sorted({picto_path for synset_id in germanet.get_antonym_synset_ids()
+                   for picto_path in picto_index.get_simple_picto_variants(synset_id)})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--picto-dir', default=PICTO_DIR)
+    args = parser.parse_args()
+
+    from .resources import get_germanet, get_picto_index
+
+    cache = NegatedPictoCache(args.picto_dir, cache_size=0)
+    picto_paths = antonym_reachable_pictos(get_germanet(), get_picto_index())
+    n_written = 0
+    for picto_path in picto_paths:
+        try:
+            cache.write(picto_path.replace('\\', '/'))
+            n_written += 1
+        except FileNotFoundError:
+            logger.warning('Pictogram not found: %s', picto_path)
+    print('Wrote %d of %d negated pictograms to %s' % (n_written, len(picto_paths), args.picto_dir))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
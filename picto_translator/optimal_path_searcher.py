@@ -1,169 +1,295 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import copy
+import heapq
 import os
+from collections import namedtuple
+
+from .containers import TranslatedSpan
+from .metrics import DECODER_EDGES, DECODER_NODES
 
 
 class OptimalPathSearcher:
     """
     Class for finding the translation with the lowest cost. By now, all words may have several translation candidates,
     but we want to take the overall path over the sentence that minimises the sum of the penalties of the translations.
-    A* search algorithm was used for this (cf. Vandeghinste et al. 2015).
+    The candidates of a sentence form a lattice: the word positions are its nodes and every pictograph is an edge from
+    the first word it translates to the word after the last one (one word for simple, several consecutive words for
+    complex pictographs). The path with the lowest cost through the lattice is found by dynamic programming (Viterbi),
+    in time linear in the number of edges. The SentenceState is not changed, so it can be decoded several times, e.g. to
+    get the k translations with the lowest costs as alternatives.
     """
 
     def __init__(self):
         self._negative_picto = os.path.normpath('METACOM_Symbole/Symbole_PNG/PNG_ohne_Rahmen/Kleine_Worte/nichtkein.png')
 
-    def _extend_queue(self, path):
+    @staticmethod
+    def get_lattice(sentence_state):
         """
-        Takes the currently best path and extends it with all possible translations.
+        Returns the Lattice of the translation candidates of a SentenceState. It is built on the first call and cached
+        in the SentenceState, so all candidates must have been added before (i.e. after the direct and semantic route).
         """
-        new_paths = []
-        current_word_candidates = path.left_to_translate.candidate_translations.pop(0)
-
-        # complex pictographs
-        if 'complex' in current_word_candidates.translation_type:
-            complex_candidate_indices = [i for i, t_type in enumerate(current_word_candidates.translation_type) if t_type == 'complex']
-
-            for complex_candidate_index in complex_candidate_indices:
-                complex_picto = current_word_candidates.picto_paths[complex_candidate_index]
-                if isinstance(current_word_candidates.bw_picto_paths[complex_candidate_index], str):
-                    complex_picto_bw = current_word_candidates.bw_picto_paths[complex_candidate_index]
-                translated_words = [current_word_candidates.token]
-                is_antonym = [current_word_candidates.antonym[complex_candidate_index]]
-                other_complex_words = []
-                current_cost = current_word_candidates.penalties[complex_candidate_index]
+        if sentence_state.lattice is None:
+            sentence_state.lattice = Lattice(sentence_state.candidate_translations)
+        return sentence_state.lattice
 
-                # see for other words belonging to the complex picto
-                for future_word_index, future_word in enumerate(path.left_to_translate.candidate_translations):
-                    if complex_picto in future_word.picto_paths:
-                        future_complex_index = future_word.picto_paths.index(complex_picto)
-                        if future_word.antonym[future_complex_index] is True:
-                            is_antonym.append(True)
-                        else:
-                            is_antonym.append(False)
-                        other_complex_words.append(future_word_index)
-                        translated_words.append(future_word.token)
-                        current_cost += future_word.penalties[future_complex_index]
-
-                if len(other_complex_words) > 0:
-                    new_path = copy.copy(path)
-                    new_path.left_to_translate.candidate_translations = [c for i, c in enumerate(
-                        path.left_to_translate.candidate_translations) if i not in other_complex_words]
-
-                    new_translated = path.translated.copy()
-                    new_translated_bw = path.translated_bw.copy()
+    @staticmethod
+    def _best_paths(lattice):
+        """
+        Returns the paths with the lowest cost from each word position to the end of the sentence, computed from right
+        to left; on equal costs, the edge that comes first in the lattice is taken.
+        """
+        best_paths = [None] * lattice.n_words + [Path(lattice.n_words, None, None, 0)]
+        for start in range(lattice.n_words - 1, -1, -1):
+            best_path = None
+            for edge in lattice.edges_from(start):
+                parent = best_paths[edge.end]
+                if best_path is None or edge.cost + parent.cost < best_path.cost:
+                    best_path = Path(start, edge, parent, edge.cost + parent.cost)
+            best_paths[start] = best_path
+        DECODER_NODES.inc(lattice.n_words, 'viterbi')
+        DECODER_EDGES.inc(len(lattice))
+        return best_paths
+
+    def _decode(self, lattice):
+        """
+        Returns the path with the lowest cost through the lattice.
+        """
+        return self._best_paths(lattice)[0]
 
-                    new_translated_words = path.translated_words.copy()
+    def _k_best(self, lattice, k):
+        """
+        Returns the k paths with the lowest costs through the lattice, sorted by cost (lazy k-best enumeration, cf.
+        Huang and Chiang 2005, algorithm 3). Each word position has a heap of candidate paths to the end of the
+        sentence, initialised with the best paths of the Viterbi pass; the next best path of a word position is only
+        computed when it is needed, which in turn asks for the next best path of a single later position. The paths
+        share their parents.
+        """
+        best_paths = self._best_paths(lattice)
+        paths = [[path] for path in best_paths]  # paths found so far from each word position, sorted by cost
+        heaps = [None] * lattice.n_words
+        popped = [None] * lattice.n_words  # last candidate taken from the heap, its successor is not on the heap yet
+        exhausted = [False] * lattice.n_words + [True]
+        n_expanded = 0
+
+        # the recursion of the algorithm is run with an explicit stack, since it can be as deep as the sentence is long
+        stack = [(0, k - 1)]
+        while stack:
+            start, rank = stack[-1]
+            if len(paths[start]) > rank or exhausted[start]:
+                stack.pop()
+                continue
+
+            if heaps[start] is None:
+                n_expanded += 1
+                heaps[start] = [(edge.cost + best_paths[edge.end].cost, order, edge, 0)
+                                for order, edge in enumerate(lattice.edges_from(start))]
+                heapq.heapify(heaps[start])
+                # the first candidate is the best path, which is already known
+                popped[start] = heapq.heappop(heaps[start])
+            heap = heaps[start]
+
+            # push the successor of the last candidate: the same edge followed by the next best path of its end
+            if popped[start] is not None:
+                _, order, edge, parent_rank = popped[start]
+                if len(paths[edge.end]) <= parent_rank + 1 and not exhausted[edge.end]:
+                    stack.append((edge.end, parent_rank + 1))
+                    continue
+                if len(paths[edge.end]) > parent_rank + 1:
+                    parent = paths[edge.end][parent_rank + 1]
+                    heapq.heappush(heap, (edge.cost + parent.cost, order, edge, parent_rank + 1))
+                popped[start] = None
+
+            if len(heap) == 0:
+                exhausted[start] = True
+                continue
+            popped[start] = heapq.heappop(heap)
+            cost, _, edge, parent_rank = popped[start]
+            paths[start].append(Path(start, edge, paths[edge.end][parent_rank], cost))
+
+        DECODER_NODES.inc(n_expanded, 'k_best')
+        return paths[0][:k]
+
+    def _read_path(self, lattice, path):
+        """
+        Returns the (black-and-white) pictographs, the translated words (TranslatedSpans) and the further translation
+        candidates along a path. A pictograph in antonymic relation with the input word is preceded by the negation
+        pictograph.
+        """
+        translated = []
+        translated_bw = []
+        translated_words = []
+        further_translations = []
+        for edge in path.edges():
+            if edge.is_antonym:
+                translated.append(self._negative_picto)
+                translated_bw.append(self._negative_picto)
+                translated_words.append(TranslatedSpan(['#NEG#']))
+                further_translations.append([])
+            picto_path, bw_picto_path = lattice.get_pictos(edge)
+            translated.append(picto_path)
+            translated_bw.append(bw_picto_path)
+            translated_words.append(TranslatedSpan.from_tokens(lattice.get_translated_words(edge),
+                                                               lattice.get_antonym_form(edge)))
+            further_translations.append(lattice.candidates[edge.start].picto_paths)
+        return translated, translated_bw, translated_words, further_translations
 
-                    # assumption: it is unlikely that all synsets of the complex picto are in an antonymic relation
-                    # with the input word; only one word can be in antonymic relation with input word
-                    # (e.g. in 'hoher Blutdruck' -> only 'hoch' can have an antonym, i.e. 'tief', but not 'Blutdruck')
-                    if True in is_antonym:
-                        new_translated.append(self._negative_picto)
-                        new_translated_words.append(tuple(['#NEG#']))
+    def find_best_path(self, doc):
+        """
+        Returns the translation with the lowest cost.
+        """
+        sentence_translations = []
+        bw_sentence_translations = []
+        translated_sentences = []
+        further_translations = []
+        for sentence_state in doc.sentence_states:
+            lattice = self.get_lattice(sentence_state)
+            path = self._decode(lattice)
+            translated, translated_bw, translated_words, further_sentence_translations = self._read_path(lattice, path)
 
-                    new_translated.append(complex_picto)
+            sentence_translations.append(translated)
+            bw_sentence_translations.append(translated_bw)
+            translated_sentences.append(translated_words)
+            further_translations.append(further_sentence_translations)
+        return sentence_translations, bw_sentence_translations, translated_sentences, further_translations
 
-                    try:
-                        if True in is_antonym:
-                            new_translated_bw.append(self._negative_picto)
-                        new_translated_bw.append(complex_picto_bw)
-                    except NameError:
-                        new_translated_bw.append(None)
+    def find_k_best_paths(self, doc, k):
+        """
+        Returns the k translations with the lowest costs of each sentence (fewer if there are less translations), sorted
+        by cost. Each translation is a tuple of the (black-and-white) pictographs, the translated words and the cost.
+        """
+        k_best_translations = []
+        for sentence_state in doc.sentence_states:
+            lattice = self.get_lattice(sentence_state)
+            sentence_translations = []
+            for path in self._k_best(lattice, k):
+                translated, translated_bw, translated_words, _ = self._read_path(lattice, path)
+                sentence_translations.append((translated, translated_bw, translated_words, path.cost))
+            k_best_translations.append(sentence_translations)
+        return k_best_translations
 
-                    new_translated_words.append(tuple(translated_words))
 
-                    new_cost = path.cost + current_cost
-                    new_path = Path(new_path.left_to_translate, new_translated, new_translated_bw, new_translated_words,
-                                    new_cost)
-                    new_paths.append(new_path)
+# edge of the Lattice translating the words from start to end (exclusive) with the candidate_index-th candidate of the
+# word at start (None: the word is not translated), its cost and whether it is in antonymic relation with the input
+LatticeEdge = namedtuple('LatticeEdge', ['start', 'end', 'candidate_index', 'cost', 'is_antonym'])
 
-        if 'simple' in current_word_candidates.translation_type:
-            simple_indices = [i for i, t_type in enumerate(current_word_candidates.translation_type) if t_type == 'simple']
-            for simple_candidate_index in simple_indices:
 
-                new_translated = path.translated.copy()
-                new_translated_bw = path.translated_bw.copy()
-                new_translated_words = path.translated_words.copy()
+class Lattice:
+    """
+    Immutable, index-addressed view of the translation candidates (WordTranslationCandidates) of a sentence, used in
+    OptimalPathSearcher. All edges are stored in one tuple sorted by their start; the edges starting at a word position
+    are found by offsets. Edges refer to the candidates by index instead of copying them.
+    """
 
-                if current_word_candidates.antonym[simple_candidate_index] is True:
-                    new_translated.append(self._negative_picto)
-                    new_translated_words.append(tuple(['#NEG#']))
+    __slots__ = ('candidates', 'n_words', '_edges', '_offsets')
+
+    def __init__(self, candidate_translations):
+        self.candidates = tuple(candidate_translations)
+        self.n_words = len(self.candidates)
+        edges = []
+        offsets = [0]
+
+        for start, word_candidates in enumerate(self.candidates):
+            n_edges = len(edges)
+
+            # complex pictographs span the word and all directly following words with the same pictograph
+            for i, translation_type in enumerate(word_candidates.translation_type):
+                if translation_type != 'complex':
+                    continue
+                complex_picto = word_candidates.picto_paths[i]
+                cost = word_candidates.penalties[i]
+                is_antonym = word_candidates.antonym[i] is True
+
+                end = start + 1
+                while end < self.n_words and complex_picto in self.candidates[end].picto_paths:
+                    future_word = self.candidates[end]
+                    future_complex_index = future_word.picto_paths.index(complex_picto)
+                    cost += future_word.penalties[future_complex_index]
+                    # assumption: it is unlikely that all synsets of the complex picto are in an antonymic relation
+                    # with the input word; only one word can be in antonymic relation with input word
+                    # (e.g. in 'hoher Blutdruck' -> only 'hoch' can have an antonym, i.e. 'tief', but not 'Blutdruck')
+                    is_antonym = is_antonym or future_word.antonym[future_complex_index] is True
+                    end += 1
 
-                new_translated.append(current_word_candidates.picto_paths[simple_candidate_index])
+                if end - start > 1:
+                    edges.append(LatticeEdge(start, end, i, cost, is_antonym))
 
-                try:
-                    if current_word_candidates.antonym[simple_candidate_index] is True:
-                        new_translated_bw.append(self._negative_picto)
-                    new_translated_bw.append(current_word_candidates.bw_picto_paths[simple_candidate_index])
-                except NameError:
-                    new_translated_bw.append(None)
+            for i, translation_type in enumerate(word_candidates.translation_type):
+                if translation_type == 'simple':
+                    edges.append(LatticeEdge(start, start + 1, i, word_candidates.penalties[i],
+                                             word_candidates.antonym[i] is True))
 
-                new_translated_words.append(tuple([current_word_candidates.token]))
-                new_cost = path.cost + current_word_candidates.penalties[simple_candidate_index]
-                new_paths.append(Path(path.left_to_translate, new_translated, new_translated_bw, new_translated_words,
-                                      new_cost))
+            # words without any translation are kept untranslated at a cost of 1
+            if len(edges) == n_edges:
+                edges.append(LatticeEdge(start, start + 1, None, 1, False))
 
-        if len(new_paths) == 0:
-            new_translated = path.translated.copy()
-            new_translated_bw = path.translated_bw.copy()
+            offsets.append(len(edges))
 
-            new_translated.append(None)
-            new_translated_bw.append(None)
-            new_paths.append(Path(path.left_to_translate, new_translated, new_translated_bw, path.translated_words +
-                                  [tuple([current_word_candidates.token])], path.cost + 1))
+        self._edges = tuple(edges)
+        self._offsets = tuple(offsets)
 
-        return new_paths, current_word_candidates.picto_paths
+    def __len__(self):
+        return len(self._edges)
 
-    def find_best_path(self, doc):
+    def edges_from(self, start):
         """
-        Returns the translation with the lowest cost.
+        Returns the edges starting at the word position start.
         """
-        sentence_translations = []
-        bw_sentence_translations = []
-        translated_sentences = []
-        further_translations = []
-        for sentence_state in doc.sentence_states:
-            path_0 = Path(sentence_state, [], [], [], 0)
-            queue = [path_0]
-            further_sentence_translations = []
-
-            while True:
-                queue, further_translation_candidates = self._extend_queue(queue[0])
-                queue.sort(key=self._take_cost)
-
-                if len(queue[0].translated_words) >= 2:
-                    if isinstance(queue[0].translated_words[-2][0], str):
-                        if queue[0].translated_words[-2][0] == '#NEG#':
-                            further_sentence_translations.append([])
-
-                further_sentence_translations.append(further_translation_candidates)
-                if len(queue[0].left_to_translate.candidate_translations) == 0:
-                    break
-
-            sentence_translations.append(queue[0].translated)
-            bw_sentence_translations.append(queue[0].translated_bw)
-            translated_sentences.append(queue[0].translated_words)
-            further_translations.append(further_sentence_translations)
-        return sentence_translations, bw_sentence_translations, translated_sentences, further_translations
+        return self._edges[self._offsets[start]:self._offsets[start + 1]]
 
-    @staticmethod
-    def _take_cost(path):
-        return path.cost
+    def get_pictos(self, edge):
+        """
+        Returns the pictograph and the black-and-white pictograph of an edge (None if the words are not translated).
+        """
+        if edge.candidate_index is None:
+            return None, None
+        word_candidates = self.candidates[edge.start]
+        bw_picto_path = word_candidates.bw_picto_paths[edge.candidate_index]
+        if edge.end - edge.start > 1 and not isinstance(bw_picto_path, str):
+            bw_picto_path = None
+        return word_candidates.picto_paths[edge.candidate_index], bw_picto_path
+
+    def get_antonym_form(self, edge):
+        """
+        Returns the surface form of the antonym shown by the pictograph of an edge, or None if the edge is not in
+        antonymic relation with its words.
+        """
+        if not edge.is_antonym:
+            return None
+        picto_path = self.candidates[edge.start].picto_paths[edge.candidate_index]
+        for word_candidates in self.candidates[edge.start:edge.end]:
+            candidate_index = word_candidates.picto_paths.index(picto_path)
+            if word_candidates.antonym[candidate_index] is True:
+                return word_candidates.antonym_forms[candidate_index]
+        return None
+
+    def get_translated_words(self, edge):
+        """
+        Returns the tokens translated by an edge.
+        """
+        return tuple(word_candidates.token for word_candidates in self.candidates[edge.start:edge.end])
 
 
 class Path:
     """
-    Used in OptimalPathSearcher to store sentence translation candidates. Stores which words still need to be translated
-    (left_to_translate), the current translation (translated) and the current cost of the translation (cost).
+    Used in OptimalPathSearcher to store a translation of the words from a word position (cursor) to the end of the
+    sentence: the edge taken at the cursor, the path translating the remaining words (parent) and the total cost. Paths
+    share their parents, so extending a path does not copy anything.
     """
 
-    def __init__(self, left_to_translate, translated, translated_bw, translated_words, cost):
-        self.left_to_translate = left_to_translate  # of type SentenceState
-        self.translated = translated
-        self.translated_bw = translated_bw
-        self.translated_words = translated_words
+    __slots__ = ('cursor', 'edge', 'parent', 'cost')
+
+    def __init__(self, cursor, edge, parent, cost):
+        self.cursor = cursor
+        self.edge = edge
+        self.parent = parent
         self.cost = cost
 
+    def edges(self):
+        """
+        Yields the edges of the path from the cursor to the end of the sentence.
+        """
+        path = self
+        while path.edge is not None:
+            yield path.edge
+            path = path.parent
@@ -1,23 +1,156 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import ast
+import json
+import os
 import sqlite3
-from flask import g 
+import threading
+from collections import defaultdict
+from urllib.parse import quote
+
+from .containers import ComplexPicto
+from .metrics import DB_QUERIES
+
+PICTO_DB_FILE = 'static/data/metacom_to_germanet.db'
+
+# lookup queries of PictoDB (cf. picto_db_migration for the indexes and the picto_resolution table they use)
+SIMPLE_PICTO_QUERY = ("SELECT p.picto_id, p.path FROM pictos p, simple_pictos s "
+                      "WHERE s.synset_id=? AND s.picto_id = p.picto_id")
+FEMALE_PICTO_QUERY = "SELECT female_picto_id FROM gendered_pictos WHERE male_picto_id=?"
+PLURAL_PICTO_QUERY = "SELECT plural_picto_id FROM numbered_pictos WHERE singular_picto_id=?"
+PICTO_PATH_QUERY = "SELECT path FROM pictos WHERE picto_id=?"
+BW_PICTO_QUERY = ("SELECT p.path FROM pictos p, bw_colour_pictos bw "
+                  "WHERE bw.colour_picto_id=? AND bw.bw_picto_id = p.picto_id")
+COMPLEX_PICTOS_QUERY = ("SELECT c.head_synset_id, c.dependent_synset_id, p.path, p.picto_id FROM pictos p, "
+                        "complex_pictos c WHERE c.head_synset_id = ? AND c.picto_id = p.picto_id")
+RESOLUTION_QUERY = ("SELECT path, bw_path, female_path, female_bw_path, plural_path, plural_bw_path "
+                    "FROM picto_resolution WHERE synset_id=?")
+
+# batch versions of the lookup queries used by PictoDB.prefetch, the IDs are passed as one JSON array
+BATCH_SIMPLE_PICTOS_QUERY = ("SELECT s.synset_id, p.picto_id, p.path FROM pictos p, simple_pictos s "
+                             "WHERE s.synset_id IN (SELECT value FROM json_each(?)) AND s.picto_id = p.picto_id")
+BATCH_FEMALE_PICTOS_QUERY = ("SELECT g.male_picto_id, p.picto_id, p.path FROM pictos p, gendered_pictos g "
+                             "WHERE g.male_picto_id IN (SELECT value FROM json_each(?)) "
+                             "AND g.female_picto_id = p.picto_id ORDER BY g.rowid")
+BATCH_PLURAL_PICTOS_QUERY = ("SELECT n.singular_picto_id, p.picto_id, p.path FROM pictos p, numbered_pictos n "
+                             "WHERE n.singular_picto_id IN (SELECT value FROM json_each(?)) "
+                             "AND n.plural_picto_id = p.picto_id ORDER BY n.singular_picto_id, n.plural_picto_id")
+BATCH_BW_PICTOS_QUERY = ("SELECT bw.colour_picto_id, p.path FROM pictos p, bw_colour_pictos bw "
+                         "WHERE bw.colour_picto_id IN (SELECT value FROM json_each(?)) AND bw.bw_picto_id = p.picto_id "
+                         "ORDER BY bw.colour_picto_id, bw.bw_picto_id")
+BATCH_COMPLEX_PICTOS_QUERY = ("SELECT c.head_synset_id, c.dependent_synset_id, p.path, p.picto_id FROM pictos p, "
+                              "complex_pictos c WHERE c.head_synset_id IN (SELECT value FROM json_each(?)) "
+                              "AND c.picto_id = p.picto_id ORDER BY c.head_synset_id, c.dependent_synset_id")
+BATCH_RESOLUTION_QUERY = ("SELECT synset_id, path, bw_path, female_path, female_bw_path, plural_path, plural_bw_path "
+                          "FROM picto_resolution WHERE synset_id IN (SELECT value FROM json_each(?))")
+
+
+class ConnectionPool:
+    """
+    Long-lived read-only connections to a SQLite database, one per thread and process, so that they can be used by
+    several threads (e.g. of a web server) and are not inherited by forked processes. The connections are opened with
+    immutable=1, i.e. SQLite neither locks the file nor checks it for changes; the database must therefore not be
+    modified while the connections are open (replace the file and restart the app instead). The file is memory-mapped
+    (mmap_size, in bytes), the page cache holds cache_size KiB and each connection keeps up to cached_statements
+    prepared statements, so that repeated queries are not compiled again.
+    """
+
+    def __init__(self, db_file, mmap_size=64 * 1024 * 1024, cache_size=16 * 1024, cached_statements=256):
+        self.db_file = db_file
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+
+    def _connect(self):
+        uri = 'file:%s?mode=ro&immutable=1' % quote(os.path.abspath(self.db_file))
+        conn = sqlite3.connect(uri, uri=True, cached_statements=self.cached_statements)
+        conn.execute('PRAGMA mmap_size=%d' % self.mmap_size)
+        conn.execute('PRAGMA cache_size=%d' % -self.cache_size)
+        return conn
+
+    def get_conn(self):
+        """
+        Returns the connection of the current thread and opens it on first use.
+        """
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def close(self):
+        """
+        Closes the connection of the current thread (if any); the next get_conn() opens a new one.
+        """
+        if getattr(self._local, 'pid', None) == os.getpid():
+            self._local.conn.close()
+        self._local.__dict__.clear()
+
+
+_pools = dict()
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(db_file):
+    """
+    Returns the ConnectionPool of the database file, which is shared by all its users in the process.
+    """
+    key = os.path.realpath(db_file)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_file)
+        return _pools[key]
+
+
+def read_picto_synset_ids(db_file=PICTO_DB_FILE):
+    """
+    Returns the IDs of all synsets that can lead to a pictogram on the semantic route as a frozenset, i.e. the synsets
+    linked to a simple pictogram and the head and dependent synsets of the complex pictograms. Other synsets are never
+    translated by the semantic route (cf. SentenceStateCreator).
+    """
+    conn = PictoDB._create_connection(db_file)
+    try:
+        synset_ids = {row[0] for row in conn.execute("SELECT synset_id FROM simple_pictos")}
+        for head_synset_id, dependent_synset_id in conn.execute(
+                "SELECT head_synset_id, dependent_synset_id FROM complex_pictos"):
+            synset_ids.add(head_synset_id)
+            synset_ids.update(ast.literal_eval(dependent_synset_id))
+    finally:
+        conn.close()
+    return frozenset(synset_ids)
 
 
 class PictoDB:
     """
-    Class that creates a connection to the pictogram-synset database and that provides methods to search the database.
+    Class that connects to the pictogram-synset database and that provides methods to search the database. All
+    PictoDB objects of a database file share its ConnectionPool, in and outside of Flask requests. If the database has
+    the picto_resolution table (cf. picto_db_migration), simple pictos are looked up with a single query; otherwise, or
+    with use_resolution_table=False, the pictos are resolved with a query per table. The queries run by all PictoDB
+    objects of the process are counted in metrics.DB_QUERIES.
     """
 
-    def __init__(self,db_file):
+    def __init__(self, db_file=PICTO_DB_FILE, use_resolution_table=True):
         self.db_file = db_file
+        self._pool = get_connection_pool(db_file)
+        self._use_resolution_table = None if use_resolution_table else False
 
     def get_conn(self):
-            if 'picto_db_conn' not in g:
-                g.picto_db_conn = self._create_connection(self.db_file)
-            return g.picto_db_conn
-    
+        return self._pool.get_conn()
+
+    def _execute(self, cur, query, parameters):
+        DB_QUERIES.inc()
+        return cur.execute(query, parameters)
+
+    def has_resolution_table(self):
+        """
+        Returns True if simple pictos are looked up in the picto_resolution table.
+        """
+        if self._use_resolution_table is None:
+            row = self.get_conn().execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='picto_resolution'").fetchone()
+            self._use_resolution_table = row is not None
+        return self._use_resolution_table
 
     @staticmethod
     def _create_connection(db_file):
@@ -35,8 +168,10 @@ class PictoDB:
         """
         conn = self.get_conn()
         cur = conn.cursor()
-        cur.execute("SELECT p.picto_id, p.path FROM pictos p, simple_pictos s WHERE s.synset_id=? AND s.picto_id = p.picto_id",
-                    (synset_id,))
+        if self.has_resolution_table():
+            return self._resolve_simple_picto(cur, synset_id, is_fem, is_plur)
+
+        self._execute(cur, SIMPLE_PICTO_QUERY, (synset_id,))
         simple_row = cur.fetchone()
         if simple_row:
             picto_id = simple_row[0]
@@ -45,20 +180,20 @@ class PictoDB:
 
             # check for female / plural pictos
             if is_fem:
-                cur.execute("SELECT female_picto_id FROM gendered_pictos WHERE male_picto_id=?", (picto_id,))
+                self._execute(cur, FEMALE_PICTO_QUERY, (picto_id,))
                 gender_row = cur.fetchone()
                 if gender_row:
                     female_picto_id = gender_row[0]
-                    cur.execute('SELECT path FROM pictos WHERE picto_id=?', (female_picto_id,))
+                    self._execute(cur, PICTO_PATH_QUERY, (female_picto_id,))
                     picto_path = cur.fetchone()[0]
                     bw_picto_path = self.get_bw_picto(female_picto_id)
 
             if is_plur:
-                cur.execute("SELECT plural_picto_id FROM numbered_pictos WHERE singular_picto_id=?", (picto_id,))
+                self._execute(cur, PLURAL_PICTO_QUERY, (picto_id,))
                 number_row = cur.fetchone()
                 if number_row:
                     plural_picto_id = number_row[0]
-                    cur.execute('SELECT path FROM pictos WHERE picto_id=?', (plural_picto_id,))
+                    self._execute(cur, PICTO_PATH_QUERY, (plural_picto_id,))
                     picto_path = cur.fetchone()[0]
                     bw_picto_path = self.get_bw_picto(plural_picto_id)
         else:
@@ -66,35 +201,245 @@ class PictoDB:
 
         return picto_path, bw_picto_path
 
+    def _resolve_simple_picto(self, cur, synset_id, is_fem, is_plur):
+        """
+        Looks up the simple picto of the synset ID in the picto_resolution table, which holds the colour and bw paths
+        of the picto and of its female and plural versions in one row. The plural version takes precedence.
+        """
+        self._execute(cur, RESOLUTION_QUERY, (synset_id,))
+        row = cur.fetchone()
+        if row is None:
+            return None, None
+        picto_path, bw_picto_path, female_path, female_bw_path, plural_path, plural_bw_path = row
+        if is_fem and female_path is not None:
+            picto_path, bw_picto_path = female_path, female_bw_path
+        if is_plur and plural_path is not None:
+            picto_path, bw_picto_path = plural_path, plural_bw_path
+        return picto_path, bw_picto_path
+
     def check_if_synset_in_complex(self, synset_id):
         """
         Returns the rows corresponding to the head_synset IDs from the complex_pictos table if there exist any.
         """
         Conn = self.get_conn()
         cur = Conn.cursor()
-        cur.execute(
-            "SELECT c.head_synset_id, c.dependent_synset_id, p.path, p.picto_id FROM pictos p, complex_pictos c WHERE c.head_synset_id = ? AND c.picto_id = p.picto_id",
-            (synset_id,))
+        self._execute(cur, COMPLEX_PICTOS_QUERY, (synset_id,))
         rows = cur.fetchall()
         return rows
 
+    def get_complex_pictos(self, synset_id):
+        """
+        Returns all complex pictos having the synset ID as head synset as ComplexPicto objects.
+        """
+        complex_pictos = []
+        for row in self.check_if_synset_in_complex(synset_id):
+            dependent_synsets = frozenset(ast.literal_eval(row[1]))
+            complex_pictos.append(ComplexPicto(row[0], dependent_synsets, row[2], self.get_bw_picto(row[3])))
+        return complex_pictos
+
     def get_bw_picto(self, picto_id):
         """
         Returns black-and-white version of coloured picto with picto_id if available.
         """
         conn = self.get_conn()
         cur = conn.cursor()
-        cur.execute("SELECT p.path FROM pictos p, bw_colour_pictos bw WHERE bw.colour_picto_id=? AND bw.bw_picto_id = p.picto_id",
-                    (picto_id,))
+        self._execute(cur, BW_PICTO_QUERY, (picto_id,))
         bw_row = cur.fetchone()
         if bw_row:
             bw_picto_path = bw_row[0]
             return bw_picto_path
         else:
             return None
-        
-    @staticmethod
-    def close_conn():
-        if 'picto_db_conn' in g:
-            g.picto_db_conn.close()
-            g.pop('picto_db_conn')
+
+    def prefetch(self, synset_ids):
+        """
+        Looks up the simple pictos (with their female and plural versions) and the complex pictos of all synset IDs at
+        once, i.e. with at most five queries independent of the number of synsets, and returns them as
+        PrefetchedPictos, which provides the same search methods as PictoDB.
+        """
+        synset_ids = json.dumps(sorted(set(synset_ids)))
+        cur = self.get_conn().cursor()
+        simple_pictos = dict()
+        complex_rows = self._execute(cur, BATCH_COMPLEX_PICTOS_QUERY, (synset_ids,)).fetchall()
+        bw_picto_ids = {row[3] for row in complex_rows}
+
+        if self.has_resolution_table():
+            for synset_id, picto, bw_picto, female, female_bw, plural, plural_bw in self._execute(
+                    cur, BATCH_RESOLUTION_QUERY, (synset_ids,)):
+                resolved = (picto, bw_picto)
+                resolved_fem = (female, female_bw) if female is not None else resolved
+                resolved_plur = (plural, plural_bw) if plural is not None else None
+                simple_pictos[synset_id] = (resolved, resolved_fem, resolved_plur)
+        else:
+            simple_rows = self._execute(cur, BATCH_SIMPLE_PICTOS_QUERY, (synset_ids,)).fetchall()
+            female_pictos = dict()
+            plural_pictos = dict()
+            if simple_rows:
+                picto_ids = json.dumps([row[1] for row in simple_rows])
+                for male_picto_id, female_picto_id, path in self._execute(cur, BATCH_FEMALE_PICTOS_QUERY,
+                                                                          (picto_ids,)):
+                    female_pictos.setdefault(male_picto_id, (female_picto_id, path))
+                for singular_picto_id, plural_picto_id, path in self._execute(cur, BATCH_PLURAL_PICTOS_QUERY,
+                                                                              (picto_ids,)):
+                    plural_pictos.setdefault(singular_picto_id, (plural_picto_id, path))
+            bw_picto_ids.update(row[1] for row in simple_rows)
+            bw_picto_ids.update(picto_id for picto_id, _ in female_pictos.values())
+            bw_picto_ids.update(picto_id for picto_id, _ in plural_pictos.values())
+
+        bw_paths = dict()
+        if bw_picto_ids:
+            for colour_picto_id, path in self._execute(cur, BATCH_BW_PICTOS_QUERY,
+                                                       (json.dumps(sorted(bw_picto_ids)),)):
+                bw_paths.setdefault(colour_picto_id, path)
+
+        if not self.has_resolution_table():
+            for synset_id, picto_id, path in simple_rows:
+                resolved = (path, bw_paths.get(picto_id))
+                resolved_fem = resolved
+                if picto_id in female_pictos:
+                    female_picto_id, female_path = female_pictos[picto_id]
+                    resolved_fem = (female_path, bw_paths.get(female_picto_id))
+                resolved_plur = None
+                if picto_id in plural_pictos:
+                    plural_picto_id, plural_path = plural_pictos[picto_id]
+                    resolved_plur = (plural_path, bw_paths.get(plural_picto_id))
+                simple_pictos[synset_id] = (resolved, resolved_fem, resolved_plur)
+
+        complex_pictos = defaultdict(list)
+        for head_synset_id, dependent_synset_id, path, picto_id in complex_rows:
+            complex_pictos[head_synset_id].append(ComplexPicto(head_synset_id, frozenset(ast.literal_eval(
+                dependent_synset_id)), path, bw_paths.get(picto_id)))
+        return PrefetchedPictos(simple_pictos, complex_pictos)
+
+    def close_conn(self):
+        """
+        Closes the pooled connection of the current thread.
+        """
+        self._pool.close()
+
+
+class PrefetchedPictos:
+    """
+    Pictos of a set of synsets looked up at once by PictoDB.prefetch, with the same search methods as PictoDB. Synsets
+    that were not prefetched have no pictos.
+    """
+
+    def __init__(self, simple_pictos, complex_pictos):
+        # synset ID -> (picto path, bw picto path) of the picto, of its female version (the picto itself if there is
+        # none) and of its plural version (None if there is none)
+        self._simple_pictos = simple_pictos
+        # head synset ID -> list of ComplexPicto objects
+        self._complex_pictos = complex_pictos
+
+    def check_if_simple_picto(self, synset_id, is_fem=None, is_plur=None):
+        """
+        Returns the picto path and bw picto path corresponding to the synset ID if it is linked to a simple picto,
+        otherwise (None, None). Returns female or plural picto version if necessary.
+        """
+        try:
+            resolved, resolved_fem, resolved_plur = self._simple_pictos[synset_id]
+        except KeyError:
+            return None, None
+        # the plural version takes precedence over the female version (cf. PictoDB.check_if_simple_picto)
+        if is_plur and resolved_plur is not None:
+            return resolved_plur
+        return resolved_fem if is_fem else resolved
+
+    def get_complex_pictos(self, synset_id):
+        """
+        Returns all complex pictos having the synset ID as head synset as ComplexPicto objects.
+        """
+        return self._complex_pictos.get(synset_id, [])
+
+
+class PictoIndex:
+    """
+    In-memory version of the pictogram-synset database. All tables are read once when the object is created and
+    flattened into dicts, so that resolving a synset to its (black-and-white) pictograms does not need any SQL query.
+    Provides the same search methods as PictoDB.
+    """
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        # (synset ID, is_fem, is_plur) -> (picto path, bw picto path)
+        self._simple_pictos = dict()
+        # head synset ID -> list of ComplexPicto objects
+        self._complex_pictos = defaultdict(list)
+        self._load()
+
+    def _load(self):
+        """
+        Reads the whole database and fills the lookup dicts.
+        """
+        conn = PictoDB._create_connection(self.db_file)
+        try:
+            cur = conn.cursor()
+            paths = dict(cur.execute("SELECT picto_id, path FROM pictos"))
+
+            bw_picto_ids = dict()
+            for colour_picto_id, bw_picto_id in cur.execute(
+                    "SELECT colour_picto_id, bw_picto_id FROM bw_colour_pictos ORDER BY colour_picto_id, bw_picto_id"):
+                bw_picto_ids.setdefault(colour_picto_id, bw_picto_id)
+
+            female_picto_ids = dict()
+            for female_picto_id, male_picto_id in cur.execute(
+                    "SELECT female_picto_id, male_picto_id FROM gendered_pictos ORDER BY rowid"):
+                female_picto_ids.setdefault(male_picto_id, female_picto_id)
+
+            plural_picto_ids = dict()
+            for singular_picto_id, plural_picto_id in cur.execute(
+                    "SELECT singular_picto_id, plural_picto_id FROM numbered_pictos "
+                    "ORDER BY singular_picto_id, plural_picto_id"):
+                plural_picto_ids.setdefault(singular_picto_id, plural_picto_id)
+
+            def resolve(picto_id):
+                bw_picto_id = bw_picto_ids.get(picto_id)
+                return paths[picto_id], paths[bw_picto_id] if bw_picto_id is not None else None
+
+            for picto_id, synset_id in cur.execute("SELECT picto_id, synset_id FROM simple_pictos"):
+                resolved = resolve(picto_id)
+                resolved_fem = resolve(female_picto_ids[picto_id]) if picto_id in female_picto_ids else resolved
+                # the plural version takes precedence over the female version (cf. PictoDB.check_if_simple_picto)
+                resolved_plur = resolve(plural_picto_ids[picto_id]) if picto_id in plural_picto_ids else None
+
+                self._simple_pictos[(synset_id, False, False)] = resolved
+                self._simple_pictos[(synset_id, True, False)] = resolved_fem
+                self._simple_pictos[(synset_id, False, True)] = resolved_plur or resolved
+                self._simple_pictos[(synset_id, True, True)] = resolved_plur or resolved_fem
+
+            for picto_id, head_synset_id, dependent_synset_id in cur.execute(
+                    "SELECT picto_id, head_synset_id, dependent_synset_id FROM complex_pictos "
+                    "ORDER BY head_synset_id, dependent_synset_id"):
+                dependent_synsets = frozenset(ast.literal_eval(dependent_synset_id))
+                picto_path, bw_picto_path = resolve(picto_id)
+                self._complex_pictos[head_synset_id].append(ComplexPicto(head_synset_id, dependent_synsets, picto_path,
+                                                                         bw_picto_path))
+        finally:
+            conn.close()
+
+    def check_if_simple_picto(self, synset_id, is_fem=None, is_plur=None):
+        """
+        Returns the picto path and bw picto path corresponding to the synset ID if it is linked to a simple picto,
+        otherwise (None, None). Returns female or plural picto version if necessary.
+        """
+        return self._simple_pictos.get((synset_id, bool(is_fem), bool(is_plur)), (None, None))
+
+    def get_complex_pictos(self, synset_id):
+        """
+        Returns all complex pictos having the synset ID as head synset as ComplexPicto objects.
+        """
+        return self._complex_pictos.get(synset_id, [])
+
+    def prefetch(self, synset_ids):
+        """
+        Returns the index itself, since all synsets are already in memory (cf. PictoDB.prefetch).
+        """
+        return self
+
+    def get_simple_picto_variants(self, synset_id):
+        """
+        Returns the set of all picto paths and bw picto paths (female and plural versions included) of the simple picto
+        corresponding to the synset ID.
+        """
+        return {path for is_fem in (False, True) for is_plur in (False, True)
+                for path in self._simple_pictos.get((synset_id, is_fem, is_plur), ()) if path is not None}
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Migrates the pictogram-synset database for faster lookups by PictoDB: adds covering indexes on the join keys and the
+table picto_resolution, which holds the colour and black-and-white paths of the simple pictogram of each synset and of
+its female and plural versions in one row, so that a simple pictogram is found with a single indexed query. The query
+plans of the lookups are printed before and after the migration, and the lookups of all synsets are checked to return
+the same pictograms as before. The database is migrated in a copy, which then replaces the output file (by default the
+database itself); running the migration again rebuilds the table. Run from the main folder of the project:
+
+    python -m picto_translator.picto_db_migration [--db-file static/data/metacom_to_germanet.db] [--output FILE]
+
+Since the app opens the database as immutable (cf. picto_db.ConnectionPool), restart it after migrating.
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+from .picto_db import (BW_PICTO_QUERY, COMPLEX_PICTOS_QUERY, FEMALE_PICTO_QUERY, PICTO_DB_FILE, PICTO_PATH_QUERY,
+                       PLURAL_PICTO_QUERY, RESOLUTION_QUERY, SIMPLE_PICTO_QUERY, PictoDB)
+
+INDEXES = (
+    # simple_pictos is searched by synset_id and only picto_id is read
+    "CREATE INDEX IF NOT EXISTS simple_pictos_synset_picto ON simple_pictos (synset_id, picto_id)",
+    # gendered_pictos is searched by male_picto_id, its primary key starts with female_picto_id
+    "CREATE INDEX IF NOT EXISTS gendered_pictos_male_female ON gendered_pictos (male_picto_id, female_picto_id)",
+    # complex_pictos is searched by head_synset_id and picto_id is read as well
+    "CREATE INDEX IF NOT EXISTS complex_pictos_head_dependent_picto "
+    "ON complex_pictos (head_synset_id, dependent_synset_id, picto_id)",
+)
+# numbered_pictos (singular, plural) and bw_colour_pictos (colour, bw) are covered by their primary keys
+
+PATH = "(SELECT path FROM pictos WHERE picto_id = {0})"
+BW_PATH = ("(SELECT path FROM pictos WHERE picto_id = "
+           "(SELECT MIN(bw_picto_id) FROM bw_colour_pictos WHERE colour_picto_id = {0}))")
+
+CREATE_RESOLUTION_TABLE = """
+CREATE TABLE picto_resolution (
+    synset_id text PRIMARY KEY,
+    path text NOT NULL,
+    bw_path text,
+    female_path text,
+    female_bw_path text,
+    plural_path text,
+    plural_bw_path text
+) WITHOUT ROWID"""
+
+# the female and plural versions are chosen as by PictoIndex (first row of gendered_pictos, lowest plural picto ID)
+FILL_RESOLUTION_TABLE = """
+INSERT INTO picto_resolution
+SELECT r.synset_id, {path}, {bw_path}, {female_path}, {female_bw_path}, {plural_path}, {plural_bw_path}
+FROM (SELECT s.synset_id, s.picto_id,
+             (SELECT female_picto_id FROM gendered_pictos g WHERE g.male_picto_id = s.picto_id ORDER BY g.rowid LIMIT 1)
+             AS female_picto_id,
+             (SELECT MIN(plural_picto_id) FROM numbered_pictos n WHERE n.singular_picto_id = s.picto_id)
+             AS plural_picto_id
+      FROM simple_pictos s) r
+WHERE r.picto_id IN (SELECT picto_id FROM pictos)""".format(
+    path=PATH.format('r.picto_id'), bw_path=BW_PATH.format('r.picto_id'),
+    female_path=PATH.format('r.female_picto_id'), female_bw_path=BW_PATH.format('r.female_picto_id'),
+    plural_path=PATH.format('r.plural_picto_id'), plural_bw_path=BW_PATH.format('r.plural_picto_id'))
+
+LOOKUP_QUERIES = (('simple picto', SIMPLE_PICTO_QUERY), ('female picto', FEMALE_PICTO_QUERY),
+                  ('plural picto', PLURAL_PICTO_QUERY), ('picto path', PICTO_PATH_QUERY),
+                  ('bw picto', BW_PICTO_QUERY), ('complex pictos', COMPLEX_PICTOS_QUERY),
+                  ('resolution', RESOLUTION_QUERY))
+
+
+def query_plans(conn):
+    """
+    Returns the EXPLAIN QUERY PLAN output of the lookup queries (the resolution query only if its table exists).
+    """
+    has_resolution_table = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='picto_resolution'").fetchone() is not None
+    plans = []
+    for name, query in LOOKUP_QUERIES:
+        if query == RESOLUTION_QUERY and not has_resolution_table:
+            continue
+        plans.append((name, [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + query, (None,))]))
+    return plans
+
+
+def print_query_plans(title, plans):
+    print(title)
+    for name, plan in plans:
+        print('  %-16s %s' % (name, '; '.join(plan)))
+
+
+def migrate(conn):
+    """
+    Adds the indexes and (re)builds the picto_resolution table in the open database.
+    """
+    with conn:
+        for index in INDEXES:
+            conn.execute(index)
+        conn.execute("DROP TABLE IF EXISTS picto_resolution")
+        conn.execute(CREATE_RESOLUTION_TABLE)
+        conn.execute(FILL_RESOLUTION_TABLE)
+    conn.execute("ANALYZE")
+
+
+def verify(db_file):
+    """
+    Returns the synset IDs (with female and plural flags) whose simple picto found in the picto_resolution table
+    differs from the one found with the queries per table.
+    """
+    with_table = PictoDB(db_file)
+    without_table = PictoDB(db_file, use_resolution_table=False)
+    synset_ids = [row[0] for row in with_table.get_conn().execute("SELECT synset_id FROM simple_pictos")]
+    differences = []
+    for synset_id in synset_ids + ['no synset']:
+        for is_fem in (False, True):
+            for is_plur in (False, True):
+                if (with_table.check_if_simple_picto(synset_id, is_fem, is_plur)
+                        != without_table.check_if_simple_picto(synset_id, is_fem, is_plur)):
+                    differences.append((synset_id, is_fem, is_plur))
+    with_table.close_conn()
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db-file', default=PICTO_DB_FILE)
+    parser.add_argument('--output', help='migrated database file (default: the database file itself)')
+    args = parser.parse_args()
+    output = args.output or args.db_file
+
+    fd, tmp_path = tempfile.mkstemp(prefix='.picto_db_', suffix='.db', dir=os.path.dirname(os.path.abspath(output)))
+    os.close(fd)
+    try:
+        shutil.copyfile(args.db_file, tmp_path)
+        conn = sqlite3.connect(tmp_path)
+        try:
+            print_query_plans('Query plans before migration:', query_plans(conn))
+            migrate(conn)
+            print_query_plans('Query plans after migration:', query_plans(conn))
+            n_synsets = conn.execute("SELECT count(*) FROM picto_resolution").fetchone()[0]
+        finally:
+            conn.close()
+
+        differences = verify(tmp_path)
+        if differences:
+            print('%d lookups differ, e.g. %s; %s not changed' % (len(differences), differences[:10], output))
+            return 1
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    print('Resolved the simple pictos of %d synsets, wrote %s' % (n_synsets, output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+JSON exports of the tables of the pictogram-synset database, as served by the /get_pictos route of the web app. The
+tables are read once per process and the exports are encoded (and gzip-compressed) once per table, projection and
+page. Like the rest of the app (cf. picto_db.ConnectionPool), they do not follow changes of the database file; restart
+the app after changing it.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import namedtuple
+
+from .cache import LRUCache
+from .picto_db import PictoDB
+
+TABLES = ('simple_pictos', 'complex_pictos', 'gendered_pictos', 'bw_colour_pictos', 'pictos', 'numbered_pictos')
+
+# encoded rows of a table: JSON (list of rows, each a list of values), the same gzip-compressed, the ETag of the JSON and
+# the number of rows of the whole table
+TableExport = namedtuple('TableExport', ['data', 'gzip_data', 'etag', 'total'])
+
+
+class PictoTables:
+    """
+    Keeps the rows of the tables of the pictogram-synset database in memory and their JSON exports in an LRU cache.
+    Exports are keyed by the table, the selected columns and the page (offset and limit).
+    """
+
+    def __init__(self, db_file, cache_size=256):
+        self.db_file = db_file
+        self.cache = LRUCache(cache_size)
+        self._tables = dict()  # table -> (column names, rows)
+        self._lock = threading.Lock()
+
+    def _read_table(self, table):
+        """
+        Returns the column names and the rows (in rowid order) of a table.
+        """
+        with self._lock:
+            cached = self._tables.get(table)
+            if cached is None:
+                conn = PictoDB._create_connection(self.db_file)
+                try:
+                    cur = conn.execute("SELECT * FROM %s ORDER BY rowid" % table)
+                    columns = tuple(description[0] for description in cur.description)
+                    rows = cur.fetchall()
+                finally:
+                    conn.close()
+                cached = (columns, rows)
+                self._tables[table] = cached
+        return cached
+
+    def get(self, table, columns=None, offset=0, limit=None):
+        """
+        Returns the TableExport of the rows offset to offset + limit (all rows if limit is None) of a table, with the
+        given columns only (all columns if None). Raises ValueError for unknown tables and columns.
+        """
+        if table not in TABLES:
+            raise ValueError('Invalid table name')
+        table_columns, rows = self._read_table(table)
+        if columns is not None:
+            columns = tuple(columns)
+            for column in columns:
+                if column not in table_columns:
+                    raise ValueError('Invalid column name: %s' % column)
+
+        key = (table, columns, offset, limit)
+        export = self.cache.get(key)
+        if export is None:
+            selected = rows[offset:offset + limit if limit is not None else None]
+            if columns is not None:
+                indices = [table_columns.index(column) for column in columns]
+                selected = [[row[i] for i in indices] for row in selected]
+            data = json.dumps(selected, separators=(',', ':')).encode('utf-8')
+            export = TableExport(data, gzip.compress(data, mtime=0), hashlib.sha1(data).hexdigest(), len(rows))
+            self.cache.put(key, export)
+        return export
+
+    def prebuild(self):
+        """
+        Reads all tables and encodes their complete exports.
+        """
+        for table in TABLES:
+            self.get(table)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def current_rss_mb():
+    """
+    Returns the resident set size of the current process in MB (Linux only, None elsewhere).
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+class ResourceRegistry:
+    """
+    Process-wide registry of the heavy, read-only resources of the translator (GermaNet, spaCy model, lookup dictionary,
+    pictogram-synset index). A resource is created by its factory on first use and exactly once per process, also if
+    several threads ask for it at the same time. Loading time and memory growth of each resource are logged and kept in
+    load_report.
+    """
+
+    def __init__(self):
+        self._factories = dict()
+        self._resources = dict()
+        self._locks = dict()
+        self._registry_lock = threading.Lock()
+        self.load_report = dict()  # name -> (loading time in s, RSS growth in MB or None)
+
+    def register(self, name, factory):
+        """
+        Registers a factory (function without arguments) creating the resource with the given name.
+        """
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """
+        Returns the resource with the given name and creates it if it has not been created yet.
+        """
+        try:
+            return self._resources[name]
+        except KeyError:
+            pass
+
+        try:
+            lock = self._locks[name]
+        except KeyError:
+            raise KeyError('No resource registered under the name %r' % name) from None
+
+        # one lock per resource, so that factories can ask for other resources
+        with lock:
+            if name not in self._resources:
+                rss_before = current_rss_mb()
+                start = time.perf_counter()
+                resource = self._factories[name]()
+                load_time = time.perf_counter() - start
+                rss_after = current_rss_mb()
+                rss_growth = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+                self.load_report[name] = (load_time, rss_growth)
+                logger.info('Loaded %s in %.2f s (RSS %s)', name, load_time,
+                            '+%.0f MB' % rss_growth if rss_growth is not None else 'n/a')
+                self._resources[name] = resource
+        return self._resources[name]
+
+    def format_load_report(self):
+        """
+        Returns a one-line summary of the loading time and memory growth of all created resources.
+        """
+        return ', '.join('%s %.2f s / %s' % (name, load_time, '+%.0f MB' % rss_growth if rss_growth is not None else 'n/a')
+                         for name, (load_time, rss_growth) in self.load_report.items())
+
+    def is_loaded(self, name):
+        """
+        Returns True if the resource with the given name has already been created.
+        """
+        return name in self._resources
+
+
+registry = ResourceRegistry()
+
+
+def _register_defaults():
+    """
+    Registers the resources of the translator. The imports are done here to avoid circular imports.
+    """
+    from .direct_route import DirectRoute
+    from .linguistic_analyser import ANALYSER_PROFILES, LinguisticAnalyser
+    from .negated_pictos import NegatedPictoCache
+    from .picto_db import PICTO_DB_FILE, PictoIndex, read_picto_synset_ids
+
+    registry.register('germanet', _create_germanet)
+    registry.register('direct_route', DirectRoute)
+    registry.register('picto_index', lambda: PictoIndex(PICTO_DB_FILE))
+    registry.register('picto_synsets', lambda: read_picto_synset_ids(PICTO_DB_FILE))
+    registry.register('negated_pictos', lambda: NegatedPictoCache(
+        cache_size=int(os.environ.get('PICTO_NEGATED_CACHE_SIZE', 512))))
+    for profile in ANALYSER_PROFILES:
+        registry.register('linguistic_analyser:' + profile, lambda profile=profile: LinguisticAnalyser(profile))
+
+
+def _create_germanet():
+    """
+    Loads GermaNet as configured by the environment variables PICTO_GERMANET_SNAPSHOT, PICTO_GERMANET_CACHE_SIZE,
+    PICTO_GERMANET_PREWARM (path of a frequency list used to fill the search cache, cf. GermaNet.prewarm),
+    PICTO_HYPERNYM_LEVELS and PICTO_HYPERNYM_STOP_AT_PICTOS (1: hypernyms of synsets with pictograms are not searched).
+    """
+    from .germanet import GermaNet
+
+    stop_synset_ids = get_picto_synsets() if os.environ.get('PICTO_HYPERNYM_STOP_AT_PICTOS', '0') == '1' else None
+    germanet = GermaNet(use_snapshot=os.environ.get('PICTO_GERMANET_SNAPSHOT', '1') == '1',
+                        cache_size=int(os.environ.get('PICTO_GERMANET_CACHE_SIZE', 20000)),
+                        hypernym_levels=int(os.environ.get('PICTO_HYPERNYM_LEVELS', 3)),
+                        stop_synset_ids=stop_synset_ids)
+    frequency_list_file = os.environ.get('PICTO_GERMANET_PREWARM')
+    if frequency_list_file:
+        start = time.perf_counter()
+        n_words = germanet.prewarm(frequency_list_file)
+        logger.info('Prewarmed the GermaNet cache with %d words in %.2f s', n_words, time.perf_counter() - start)
+    return germanet
+
+
+def get_germanet():
+    """
+    Returns the GermaNet object of the process.
+    """
+    return registry.get('germanet')
+
+
+def get_direct_route():
+    """
+    Returns the DirectRoute object (with the lookup dictionary) of the process.
+    """
+    return registry.get('direct_route')
+
+
+def get_picto_index():
+    """
+    Returns the in-memory pictogram-synset index (PictoIndex) of the process.
+    """
+    return registry.get('picto_index')
+
+
+def get_picto_synsets():
+    """
+    Returns the IDs of the synsets that can lead to a pictogram (cf. picto_db.read_picto_synset_ids) as a frozenset.
+    """
+    return registry.get('picto_synsets')
+
+
+def get_negated_pictos():
+    """
+    Returns the cache of negated pictogram variants (NegatedPictoCache) of the process.
+    """
+    return registry.get('negated_pictos')
+
+
+def get_linguistic_analyser(profile='lean'):
+    """
+    Returns the LinguisticAnalyser of the process for the given profile.
+    """
+    from .linguistic_analyser import ANALYSER_PROFILES
+
+    if profile not in ANALYSER_PROFILES:
+        raise ValueError('Invalid analyser profile. Expected one of: %s' % list(ANALYSER_PROFILES))
+    return registry.get('linguistic_analyser:' + profile)
+
+
+_register_defaults()
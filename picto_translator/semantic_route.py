@@ -1,33 +1,36 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from .picto_db import PictoDB
+from .picto_db import PICTO_DB_FILE, PictoDB
+from .resources import get_picto_index
 
 
 class SemanticRoute:
     """
     Class that stores the pictogram-synset database and that contains all necessary methods to translate via the
-    semantic route, i.e. using GermaNet.
+    semantic route, i.e. using GermaNet. By default, the database is loaded into memory once per process (PictoIndex,
+    cf. resources); with use_picto_index=False, the synsets of each document are looked up in the database (PictoDB)
+    with a constant number of SQL queries.
     """
 
-    def __init__(self):
-        self._picto_db = PictoDB('static/data/metacom_to_germanet.db')
+    def __init__(self, use_picto_index=True):
+        if use_picto_index:
+            self._picto_db = get_picto_index()
+        else:
+            self._picto_db = PictoDB(PICTO_DB_FILE)
 
-    def _find_complex_pictos(self, synset, sentence_state):
+    def _find_complex_pictos(self, synset, sentence_state, picto_db):
         """
         Adds all potential translation candidates consisting of complex pictographs (i.e. pictographs translating more
         than one word) to the SentenceState.
         """
         # search for synset as head synset
-        db_entry_complex = self._picto_db.check_if_synset_in_complex(synset.id)
-
-        for row in db_entry_complex:
+        for complex_picto in picto_db.get_complex_pictos(synset.id):
 
-            dependent_synsets = list(eval(row[1]))
-            picto_path = row[2]
-            bw_picto_path = self._picto_db.get_bw_picto(row[3])
+            picto_path = complex_picto.picto_path
+            bw_picto_path = complex_picto.bw_picto_path
 
-            all_synsets = dependent_synsets + [synset.id]
+            all_synsets = list(complex_picto.dependent_synsets) + [synset.id]
 
             sentence_indices, penalties = self._find_consecutive_synsets(sentence_state, all_synsets)
 
@@ -40,53 +43,67 @@ class SemanticRoute:
     def _find_consecutive_synsets(self, sentence_state, complex_synsets):
         """
         Checks whether all synsets of the complex picto can be found in the document such that the words with the
-        respective synsets are consecutive of each other.
+        respective synsets are consecutive of each other. The words are looked up in the inverted index of the sentence
+        (SentenceState.synset_positions): going through the words in order, each word is matched with its first synset
+        of the complex picto that is not matched yet. If these words are not consecutive, the other words of the
+        synsets found more than once in the sentence are tried instead.
         """
-        double_synsets = dict()
-        all_word_synsets = [synset.id for word_synsets in sentence_state.word_synsets for synset in word_synsets.synsets]
-        for s in complex_synsets:
-            if all_word_synsets.count(s) > 1:
-                double_synsets[s] = [sentence_index
-                                     for sentence_index, word_synsets in enumerate(sentence_state.word_synsets)
-                                     for synset in word_synsets.synsets if synset.id == s]
+        synset_positions = sentence_state.synset_positions
+        if synset_positions is None:
+            synset_positions = sentence_state.index_synsets()
+        if not all(s in synset_positions for s in complex_synsets):
+            return None, None
+
+        # word index -> {synset ID: index of its first occurrence in the synsets of the word}
+        word_matches = dict()
+        for s in set(complex_synsets):
+            for word_index, synset_index in synset_positions[s]:
+                word_matches.setdefault(word_index, dict()).setdefault(s, synset_index)
 
         matched_complex = []
         sentence_indices = []
         penalties = []
 
-        for word_index, word_synsets in enumerate(sentence_state.word_synsets):
-            for synset_index, candidate_synset in enumerate(word_synsets.synsets):
-                if candidate_synset.id in matched_complex:
-                    continue
-
-                elif candidate_synset.id in complex_synsets:
-                    matched_complex.append(candidate_synset.id)
-                    sentence_indices.append(word_index)
-                    penalties.append(word_synsets.penalties[synset_index])
-                    break
-
-        if set(matched_complex) == set(complex_synsets):
-            if sorted(sentence_indices) == list(range(min(sentence_indices), max(sentence_indices) + 1)):
-                return sentence_indices, penalties
-
-            else:
-                for i, s in enumerate(sentence_indices):
-                    synset = matched_complex[i]
-                    if synset in double_synsets:
-                        other_sentence_indices = double_synsets[synset]
-                        for o in other_sentence_indices:
-                            sentence_indices[i] = o
-                            if sorted(sentence_indices) == list(range(min(sentence_indices), max(sentence_indices) + 1)):
-                                return sentence_indices, penalties
-                return None, None
-        else:
+        for word_index in sorted(word_matches):
+            unmatched = [(synset_index, s) for s, synset_index in word_matches[word_index].items()
+                         if s not in matched_complex]
+            if len(unmatched) > 0:
+                synset_index, s = min(unmatched)
+                matched_complex.append(s)
+                sentence_indices.append(word_index)
+                penalties.append(sentence_state.word_synsets[word_index].penalties[synset_index])
+
+        if len(matched_complex) < len(set(complex_synsets)):
             return None, None
 
+        if self._are_consecutive(sentence_indices):
+            return sentence_indices, penalties
+
+        # the words tried last are kept when moving on to the next synset
+        for i, s in enumerate(matched_complex):
+            if len(synset_positions[s]) > 1:
+                for word_index, _ in synset_positions[s]:
+                    sentence_indices[i] = word_index
+                    if self._are_consecutive(sentence_indices):
+                        return sentence_indices, penalties
+        return None, None
+
+    @staticmethod
+    def _are_consecutive(sentence_indices):
+        """
+        Checks whether the sentence indices are distinct and, in sorted order, follow each other without gaps.
+        """
+        return (max(sentence_indices) - min(sentence_indices) == len(sentence_indices) - 1
+                and len(set(sentence_indices)) == len(sentence_indices))
+
     def semantic_route(self, doc):
         """
         Takes a document analysed by spaCy and adds all possible translations on the semantic route (i.e. via semantic
-        relations of GermaNet) to the SentenceStates.
+        relations of GermaNet) to the SentenceStates. The pictos of all synsets of the document are looked up at once.
         """
+        picto_db = self._picto_db.prefetch(synset.id for sentence_state in doc.sentence_states
+                                           for word_synsets in sentence_state.word_synsets
+                                           for synset in word_synsets.synsets)
         for sentence_state in doc.sentence_states:
 
             for word_index, synset_collection in enumerate(sentence_state.word_synsets):
@@ -96,6 +113,11 @@ class SemanticRoute:
                     # check if any of the synsets is in the Picto DB
                     for synset_index, synset in enumerate(synset_collection.synsets):
 
+                        # the surface form of an antonym is resolved here, so that it can be shown with the negated
+                        # pictogram without analysing the word again
+                        is_antonym = synset_collection.antonym[synset_index]
+                        antonym_form = synset.lexunits[0].orthform if is_antonym is True else None
+
                         # check morphology to get female or plural picto if necessary
                         if sentence_state.sentence[word_index].has_morph():
                             morph_dict = sentence_state.sentence[word_index].morph.to_dict()
@@ -112,29 +134,29 @@ class SemanticRoute:
                                     is_plur = True
 
                             # simple pictos
-                            found_picto, found_picto_bw = self._picto_db.check_if_simple_picto(synset.id, is_fem, is_plur)
+                            found_picto, found_picto_bw = picto_db.check_if_simple_picto(synset.id, is_fem, is_plur)
 
                             if not found_picto is None:
                                 sentence_state.candidate_translations[word_index].add_candidate(found_picto,
                                                                                                 synset_collection.penalties[
                                                                                                     synset_index], 'simple',
-                                                                                                synset_collection.antonym[
-                                                                                                    synset_index],
-                                                                                                found_picto_bw)
+                                                                                                is_antonym,
+                                                                                                found_picto_bw,
+                                                                                                antonym_form)
 
                         else:
                             # simple pictos
-                            found_picto, found_picto_bw = self._picto_db.check_if_simple_picto(synset.id)
+                            found_picto, found_picto_bw = picto_db.check_if_simple_picto(synset.id)
 
                             if not found_picto is None:
                                 sentence_state.candidate_translations[word_index].add_candidate(found_picto,
                                                                                                 synset_collection.penalties[
                                                                                                     synset_index],
                                                                                                 'simple',
-                                                                                                synset_collection.antonym[
-                                                                                                    synset_index],
-                                                                                                found_picto_bw)
+                                                                                                is_antonym,
+                                                                                                found_picto_bw,
+                                                                                                antonym_form)
 
                         # complex pictos
-                        sentence_state = self._find_complex_pictos(synset, sentence_state)
+                        sentence_state = self._find_complex_pictos(synset, sentence_state, picto_db)
         return doc
@@ -1,25 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-from .germanet import GermaNet
 from .containers import SentenceState
+from .resources import get_germanet, get_picto_synsets
 
 
 class SentenceStateCreator:
     """
-    Class that loads GermaNet and adds SentenceStates to the analysed input sentences. These are also filled with all
-    matching synsets for the input words.
+    Class that adds SentenceStates to the analysed input sentences. These are also filled with all matching synsets for
+    the input words, using the GermaNet of the process (cf. resources). With prune_synsets=True, only the synsets that
+    can lead to a pictogram (cf. picto_db.read_picto_synset_ids) are kept, since the semantic route finds no pictogram
+    for the others.
     """
 
-    def __init__(self):
-        self._germanet = GermaNet()
+    def __init__(self, prune_synsets=True):
+        self._germanet = get_germanet()
+        self._picto_synsets = get_picto_synsets() if prune_synsets else None
 
     def create_sentence_states(self, doc):
         """
         Adds a SentenceState to each analysed sentence of the input text and inserts data in WordSynsets within all
         SentenceStates; in other words, finds all matching synsets (direct, hypernyms, xpos, antonyms) for all input
         words with their penalties and an indication about whether the synset refers to an antonymic concept of the
-        original input word.
+        original input word. The synsets of each sentence are indexed by word position (SentenceState.index_synsets).
+        The numbers of synsets found and pruned are added to the counters of the document.
         """
         for sentence in doc.sentence_list:
             sentence_state = SentenceState(sentence)
@@ -43,12 +47,30 @@ class SentenceStateCreator:
                 else:
                     synsets, penalties, is_antonym = self._germanet.get_synsets_and_penalties(word)
 
+                # pruned only now, since the separable verb is used if it has any synsets
+                n_synsets = len(synsets)
+                if self._picto_synsets is not None:
+                    synsets, penalties, is_antonym = self._prune_synsets(synsets, penalties, is_antonym)
+                doc.n_synsets += n_synsets
+                doc.n_pruned_synsets += n_synsets - len(synsets)
+
                 sentence_state.word_synsets[i].synsets = synsets
                 sentence_state.word_synsets[i].penalties = penalties
                 sentence_state.word_synsets[i].antonym = is_antonym
 
+            sentence_state.index_synsets()
             doc.sentence_states.append(sentence_state)
 
+    def _prune_synsets(self, synsets, penalties, is_antonym):
+        """
+        Returns the synsets that can lead to a pictogram with their penalties and antonymic relations. The items of the
+        three lists are kept by position, so that the semantic route reads the same values for each kept synset.
+        """
+        kept = [i for i, synset in enumerate(synsets) if synset.id in self._picto_synsets]
+        if len(kept) == len(synsets):
+            return synsets, penalties, is_antonym
+        return [synsets[i] for i in kept], [penalties[i] for i in kept], [is_antonym[i] for i in kept]
+
     @staticmethod
     def _detect_separable_verbs(word):
         """
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from .cache import LRUCache
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# version of the cached translations: to be increased whenever a change of the code changes the translations or the
+# result classes (e.g. TranslatedSpan), so that the entries of the shared store written by older versions are not found
+TRANSLATION_FORMAT_VERSION = 1
+
+
+def make_key_prefix(settings, data_files):
+    """
+    Returns a fingerprint of TRANSLATION_FORMAT_VERSION, the settings of the translator (cf.
+    Text2PictoTranslator.settings) and the sizes and modification times of the data files (files or directories), to be
+    used as key_prefix of a CachedTranslator: cached translations made by another version of the code, with other
+    settings or with other data are not found.
+    """
+    fingerprint = hashlib.sha1(('%d;%r;' % (TRANSLATION_FORMAT_VERSION, sorted(settings.items()))).encode('utf-8'))
+    for path in data_files:
+        if os.path.isdir(path):
+            paths = sorted(os.path.join(path, file_name) for file_name in os.listdir(path))
+        else:
+            paths = [path]
+        for file_path in paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                fingerprint.update(('%s:missing;' % file_path).encode('utf-8'))
+                continue
+            fingerprint.update(('%s:%d:%d;' % (file_path, stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+    return fingerprint.hexdigest()[:16]
+
+
+class SQLiteTranslationStore:
+    """
+    Translation cache in a local SQLite file, shared by all processes (e.g. gunicorn workers) using the same file.
+    Entries expire after ttl seconds; when there are more than maxsize entries, the ones expiring first are removed.
+    Values are pickled, so the file must only be writable by the app.
+    """
+
+    def __init__(self, db_file, maxsize=100000, ttl=86400):
+        self.db_file = db_file
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._n_puts = Counter('picto_translation_store_puts_total', 'Translations written to the shared store')
+        conn = self._connect()
+        try:
+            conn.execute("CREATE TABLE IF NOT EXISTS translations (key TEXT PRIMARY KEY, value BLOB, expires REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS translations_expires ON translations (expires)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _get_conn(self):
+        # sqlite3 connections must not be shared between threads or inherited by forked processes
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = self._connect()
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def get(self, key):
+        row = self._get_conn().execute("SELECT value FROM translations WHERE key = ? AND expires > ?",
+                                       (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def put(self, key, value):
+        conn = self._get_conn()
+        conn.execute("INSERT OR REPLACE INTO translations (key, value, expires) VALUES (?, ?, ?)",
+                     (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time() + self.ttl))
+        # the new count is returned under the lock of the counter, so exactly one put of every 1000 trims the store
+        if self._n_puts.inc() % 1000 == 0:
+            self._trim(conn)
+
+    def _trim(self, conn):
+        conn.execute("DELETE FROM translations WHERE expires <= ?", (time.time(),))
+        conn.execute("DELETE FROM translations WHERE key IN (SELECT key FROM translations ORDER BY expires "
+                     "LIMIT max(0, (SELECT count(*) FROM translations) - ?))", (self.maxsize,))
+
+
+class CachedTranslator:
+    """
+    Caches the translations of a Text2PictoTranslator per line of text. The cache is keyed on the exact text of the
+    line (and k_best), because all display options of the web app are applied to the translation afterwards; toggling
+    an option therefore never runs the analysis, the routes and the path search again. The translations contain no
+    spaCy objects (cf. TranslatedSpan), so they can be pickled into the shared store. Each process has an in-memory
+    LRU cache with size- and time-based eviction; with a SQLiteTranslationStore as shared store, translations of other
+    processes are found as well. The key_prefix (cf. make_key_prefix) separates the translations made with different
+    settings or data. The numbers of synsets found and pruned for each line are cached with its translation, so that
+    they are also known for the lines that are not translated again.
+    """
+
+    def __init__(self, translator, maxsize=2048, ttl=3600, shared_store=None, key_prefix=''):
+        self.translator = translator
+        self.cache = LRUCache(maxsize, ttl)
+        self.shared_store = shared_store
+        self.key_prefix = key_prefix
+        # the counters are incremented by all request threads sharing the CachedTranslator
+        self.shared_hits = Counter('picto_translation_shared_hits_total', 'Translations found in the shared store')
+        self.shared_errors = Counter('picto_translation_shared_errors_total', 'Failed reads and writes of the shared '
+                                     'store')
+
+    def translate_batch(self, texts, batch_size=64, n_process=1, k_best=1, synset_counts=None):
+        """
+        Returns the output of Text2PictoTranslator.translate_batch(). Only the texts that are not cached are translated
+        (in one batch). If synset_counts is a list, the numbers of synsets found and pruned for each text (cached or
+        not) are appended to it as tuples (found, pruned).
+        """
+        texts = list(texts)
+        keys = [(self.key_prefix, k_best, text) for text in texts]
+        entries = [self.cache.get(key) for key in keys]  # (translation, (found, pruned)) per text
+
+        if self.shared_store is not None:
+            for i, key in enumerate(keys):
+                if entries[i] is None:
+                    entries[i] = self._get_shared(key)
+                    if entries[i] is not None:
+                        self.shared_hits.inc()
+                        self.cache.put(key, entries[i])
+
+        missing = dict()  # text -> indices, every text is translated once
+        for i, entry in enumerate(entries):
+            if entry is None:
+                missing.setdefault(texts[i], []).append(i)
+        if len(missing) > 0:
+            new_synset_counts = []
+            new_translations = self.translator.translate_batch(list(missing), batch_size=batch_size,
+                                                               n_process=n_process, k_best=k_best,
+                                                               synset_counts=new_synset_counts)
+            for (text, indices), translation, counts in zip(missing.items(), new_translations, new_synset_counts):
+                entry = (translation, counts)
+                self.cache.put(keys[indices[0]], entry)
+                if self.shared_store is not None:
+                    self._put_shared(keys[indices[0]], entry)
+                for i in indices:
+                    entries[i] = entry
+        if synset_counts is not None:
+            synset_counts.extend(counts for _, counts in entries)
+        return [translation for translation, _ in entries]
+
+    def _get_shared(self, key):
+        try:
+            return self.shared_store.get(repr(key))
+        except (sqlite3.Error, pickle.UnpicklingError, EOFError, AttributeError, ImportError) as e:
+            # AttributeError and ImportError: written by a version of the app with other result classes
+            self.shared_errors.inc()
+            logger.warning('Shared translation cache not readable: %s', e)
+            return None
+
+    def _put_shared(self, key, entry):
+        try:
+            self.shared_store.put(repr(key), entry)
+        except sqlite3.Error as e:
+            self.shared_errors.inc()
+            logger.warning('Shared translation cache not writable: %s', e)
+
+    def stats(self):
+        """
+        Returns the counters of the cache of this process.
+        """
+        stats = self.cache.stats()
+        stats.update({'pid': os.getpid(), 'shared_store': self.shared_store.db_file if self.shared_store else None,
+                      'shared_hits': self.shared_hits.get(), 'shared_errors': self.shared_errors.get()})
+        return stats
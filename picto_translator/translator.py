@@ -1,41 +1,107 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import logging
+
 from .containers import Document
-from .direct_route import DirectRoute
-from .linguistic_analyser import LinguisticAnalyser
+from .direct_route import DICTIONARY_FILE
+from .germanet_snapshot import GERMANET_SNAPSHOT_DIR, GERMANET_XML_DIR
+from .metrics import PRUNED_SYNSETS, SYNSETS, timed
 from .optimal_path_searcher import OptimalPathSearcher
+from .picto_db import PICTO_DB_FILE
+from .resources import get_direct_route, get_germanet, get_linguistic_analyser
 from .semantic_route import SemanticRoute
 from .sentence_state_creator import SentenceStateCreator
 
+logger = logging.getLogger(__name__)
+
+# the data files the translations are made from (e.g. to invalidate cached translations when one of them changes)
+DATA_FILES = (DICTIONARY_FILE, PICTO_DB_FILE, GERMANET_XML_DIR, GERMANET_SNAPSHOT_DIR)
+
 
 class Text2PictoTranslator:
     """
     Wraps up the whole Text2Picto translation process including shallow linguistic analysis, direct route, semantic
-    route and optimal path search.
+    route and optimal path search. With use_picto_index=False, the semantic route searches the pictogram-synset
+    database with SQL queries instead of the in-memory index. analyser_profile selects the spaCy components that are
+    loaded (cf. linguistic_analyser.ANALYSER_PROFILES). The spaCy model, GermaNet, the lookup dictionary and the
+    pictogram-synset index are shared by all translators of the process (cf. resources). With prune_synsets=True, the
+    synsets without pictograms are dropped before the semantic route (cf. SentenceStateCreator); the numbers of synsets
+    found and pruned are counted in metrics.SYNSETS and metrics.PRUNED_SYNSETS.
     """
 
-    def __init__(self):
-        self._linguistic_analyser = LinguisticAnalyser()
-        self._sentence_state_creator = SentenceStateCreator()
-        self._direct_path = DirectRoute()
-        self._semantic_path = SemanticRoute()
+    def __init__(self, use_picto_index=True, analyser_profile='lean', prune_synsets=True):
+        self.analyser_profile = analyser_profile
+        self.prune_synsets = prune_synsets
+        self._linguistic_analyser = get_linguistic_analyser(analyser_profile)
+        self._sentence_state_creator = SentenceStateCreator(prune_synsets)
+        self._direct_path = get_direct_route()
+        self._semantic_path = SemanticRoute(use_picto_index)
         self._optimal_path_searcher = OptimalPathSearcher()
 
-    def translate(self, text, use_bw=False, hide_text=False, hide_inflection=False, capital_letter=False,hide_articles=False, hide_prepositions=False, hide_punctuations=False):
+    def settings(self):
+        """
+        Returns the settings that determine the translations (the analyser profile, the pruning of synsets and the
+        settings of GermaNet), e.g. to key cached translations.
+        """
+        return {'analyser_profile': self.analyser_profile, 'prune_synsets': self.prune_synsets,
+                'germanet': get_germanet().settings}
+
+    def translate(self, text, use_bw=False, hide_text=False, hide_inflection=False, capital_letter=False,hide_articles=False, hide_prepositions=False, hide_punctuations=False, k_best=1):
         """
         Takes any input text to be translated and returns a pictogram translation (list of sentence translations, these
-        are lists of pictogram names).
+        are lists of pictogram names). With k_best > 1, the k translations with the lowest costs of each sentence
+        (cf. OptimalPathSearcher.find_k_best_paths) are returned as well, as fifth item.
         """
         doc = Document(text)
-        doc.analysed_doc, doc.sentence_list = self._linguistic_analyser.analyse(doc.string)
-        self._sentence_state_creator.create_sentence_states(doc)
-        doc = self._direct_path.direct_route(doc)
-        doc = self._semantic_path.semantic_route(doc)
-        translation, bw_translation, translated_words, further_translations = self._optimal_path_searcher.find_best_path(doc)
-        return translation, bw_translation, translated_words, further_translations  
-      
-
-
+        with timed('analysis'):
+            doc.analysed_doc, doc.sentence_list = self._linguistic_analyser.analyse(doc.string)
+        return self._translate_document(doc, k_best)
 
+    def translate_batch(self, texts, batch_size=64, n_process=1, k_best=1, synset_counts=None):
+        """
+        Translates several input texts (e.g. the lines of a longer text) at once. The shallow linguistic analysis of all
+        texts is run in batches with spaCy's nlp.pipe (n_process > 1 starts several processes); the remaining steps are
+        run per text. Returns a list with the output of translate() for each input text. If synset_counts is a list, the
+        numbers of synsets found and pruned for each text are appended to it as tuples (found, pruned).
+        """
+        texts = list(texts)
+        translations = []
+        n_synsets = n_pruned_synsets = 0
+        # the analysis is run lazily by nlp.pipe, so it is timed while the analysed texts are taken
+        analysed = iter(self._linguistic_analyser.analyse_batch(texts, batch_size=batch_size, n_process=n_process))
+        for text in texts:
+            with timed('analysis'):
+                analysed_doc, sentence_list = next(analysed)
+            doc = Document(text)
+            doc.analysed_doc, doc.sentence_list = analysed_doc, sentence_list
+            translations.append(self._translate_document(doc, k_best))
+            n_synsets += doc.n_synsets
+            n_pruned_synsets += doc.n_pruned_synsets
+            if synset_counts is not None:
+                synset_counts.append((doc.n_synsets, doc.n_pruned_synsets))
+        logger.debug('Pruned %d of %d synsets of %d texts', n_pruned_synsets, n_synsets, len(texts))
+        return translations
 
+    def _translate_document(self, doc, k_best=1):
+        """
+        Translates an analysed Document along the direct and the semantic route and returns the translation with the
+        lowest cost (and the k_best translations with the lowest costs, if k_best > 1).
+        """
+        with timed('sentence_states'):
+            self._sentence_state_creator.create_sentence_states(doc)
+        SYNSETS.inc(doc.n_synsets)
+        PRUNED_SYNSETS.inc(doc.n_pruned_synsets)
+        with timed('direct_route'):
+            doc = self._direct_path.direct_route(doc)
+        with timed('semantic_route'):
+            doc = self._semantic_path.semantic_route(doc)
+        with timed('path_search'):
+            translation, bw_translation, translated_words, further_translations = \
+                self._optimal_path_searcher.find_best_path(doc)
+        if k_best > 1:
+            # decodes the lattices cached in the SentenceStates by find_best_path again
+            with timed('k_best'):
+                k_best_translations = self._optimal_path_searcher.find_k_best_paths(doc, k_best)
+            return translation, bw_translation, translated_words, further_translations, k_best_translations
+        return translation, bw_translation, translated_words, further_translations
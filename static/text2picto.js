@@ -54,55 +54,18 @@ document.addEventListener('DOMContentLoaded', function(){
         translateText(textInput.value);
     });  
     
-    bwCheckbox.addEventListener('change', handleBwCheckboxChange);
-
-    function handleBwCheckboxChange() {
-        if (textInput.value) {
-            translateText(textInput.value);
-        }
-    }
-
-
-    hideInflectionCheckbox.addEventListener('change', handleHideInflectionCheckboxChange);
-
-    function handleHideInflectionCheckboxChange() {
-        if (textInput.value) {
-            translateText(textInput.value);
-        }
-    }
-
-    capitalLetterCheckbox.addEventListener('change', function() {
-        const textElements = document.querySelectorAll('.pictogram-text');
-        const isUppercase = capitalLetterCheckbox.checked;
-        textElements.forEach(element => {
-            element.style.textTransform = isUppercase ? 'uppercase' : 'none';
+    // The translation is requested independent of the display options (payload: 'tokens'), so the options below are
+    // applied to the last translation without a request to the server
+    let currentTranslations = null;
+
+    [bwCheckbox, hideInflectionCheckbox, capitalLetterCheckbox, hideArticlesCheckbox, hidePrepositionsCheckbox,
+     hidePunctuationsCheckbox].forEach(checkbox => {
+        checkbox.addEventListener('change', function() {
+            if (currentTranslations) {
+                displayTranslations(applyDisplayOptions(currentTranslations));
+            }
         });
     });
-    
-
-    hideArticlesCheckbox.addEventListener('change', handleHideArticlesCheckboxChange);
-
-    function handleHideArticlesCheckboxChange() {
-        if (textInput.value) {
-            translateText(textInput.value);
-        }
-    }
-
-    hidePrepositionsCheckbox.addEventListener('change', handleHidePrepositionsCheckboxChange);
-
-    function handleHidePrepositionsCheckboxChange() {
-        if (textInput.value) {
-            translateText(textInput.value);
-        }
-    }
-
-    hidePunctuationsCheckbox.addEventListener('change', handleHidePunctuationsCheckboxChange);
-
-    function handleHidePunctuationsCheckboxChange() {
-        if (textInput.value) {
-            translateText(textInput.value);
-        }
-    }
 
     hideTextCheckbox.addEventListener('change', function() {
         const textElements = document.querySelectorAll('.pictogram-text');
@@ -116,14 +79,8 @@ document.addEventListener('DOMContentLoaded', function(){
 
     function translateText(text) {
         const bodyData = {
-            text: text, 
-            use_bw: bwCheckbox.checked,
-            hide_text: hideTextCheckbox.checked,
-            use_lemmas: hideInflectionCheckbox.checked,
-            use_upper: capitalLetterCheckbox.checked,
-            no_art: hideArticlesCheckbox.checked,
-            no_prep: hidePrepositionsCheckbox.checked,
-            no_punct: hidePunctuationsCheckbox.checked,
+            text: text,
+            payload: 'tokens',
         };
         // Display some loading feedback here if necessary
         fetch("translate", {
@@ -142,15 +99,56 @@ document.addEventListener('DOMContentLoaded', function(){
             }
         })
         .then(data => {
-            displayTranslations(data.translations);
+            currentTranslations = data.translations;
+            displayTranslations(applyDisplayOptions(currentTranslations));
         })
         .catch(error => {
             console.error('Error:', error);
         });
+    }
 
 
+    function shouldFilter(token) {
+        return (hideArticlesCheckbox.checked && token.tag === 'ART') ||
+               (hidePrepositionsCheckbox.checked && token.tag === 'APPR') ||
+               (hidePunctuationsCheckbox.checked && token.is_punct);
+    }
+
+
+    // Turns the option-independent items of the payload into the items that are displayed
+    function applyDisplayOptions(items) {
+        const translations = [];
+        items.forEach(item => {
+            if (item.line_break) {
+                translations.push(item);
+                return;
+            }
+            if (item.tokens.some(shouldFilter)) {
+                return;
+            }
+
+            let text;
+            if (item.negated && item.text) {
+                text = item.text;
+            } else if (hideInflectionCheckbox.checked) {
+                text = item.tokens[0].lemma;
+            } else if (capitalLetterCheckbox.checked) {
+                text = item.tokens.map(token => token.upper).join(' ');
+            } else {
+                text = item.tokens.map(token => token.text).join(' ');
+            }
+
+            const src = bwCheckbox.checked ? item.bw_src : item.src;
+            if (src) {
+                translations.push({text: text, src: src, alternatives: item.alternatives || []});
+            } else {
+                translations.push({text: text, no_picto: true});
+            }
+        });
+        return translations;
+    }
+
 
-    
     function displayTranslations(translations) {
         translationContainer.innerHTML = ''; // Clear the container
         translations.forEach((translation, index) => {
@@ -163,7 +161,7 @@ document.addEventListener('DOMContentLoaded', function(){
      
                 if (translation.no_picto) {
                     const textDiv = document.createElement('div');
-                    textDiv.className = 'pictogram-text';
+                    textDiv.className = hideTextCheckbox.checked ? 'pictogram-text hide-text' : 'pictogram-text';
                     textDiv.textContent = translation.text; // Set the word as text
                     frame.appendChild(textDiv);
                 } else {
@@ -181,7 +179,7 @@ document.addEventListener('DOMContentLoaded', function(){
 
                 if (!translation.no_picto) {
                     const textLabel = document.createElement('div');
-                    textLabel.className = 'pictogram-text';
+                    textLabel.className = hideTextCheckbox.checked ? 'pictogram-text hide-text' : 'pictogram-text';
                     textLabel.textContent = translation.text; // Set the word as text
                     frame.appendChild(textLabel);
                 }
@@ -233,8 +231,6 @@ document.addEventListener('click', function(event) {
     }
   });
 
-    }
-
       
 
 function updatePictogramSize(size) {